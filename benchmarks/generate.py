@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import csv
+import random
+import argparse
+
+ELECTION_FORM = [
+    ("Title", "Election %(election_id)d"),
+    ("Description", "Synthetic election %(election_id)d"),
+    ("Start date time", "10/10/2020 10:00:00"),
+    ("Duration in hours", "48"),
+    ("Login link on home", "TRUE"),
+    ("extra: shuffle_categories", "TRUE"),
+    ("extra: answer_columns_size", "3"),
+]
+
+QUESTION_FORM = [
+    ("Title", "Question %(question_num)d"),
+    ("Description", "Synthetic question %(question_num)d"),
+    ("Maximum choices", "%(max)d"),
+    ("Minimum choices", "0"),
+    ("Number of winners", "%(max)d"),
+    ("Totals", "over-total-votes"),
+    ("Voting system", "plurality-at-large"),
+    ("Randomize options order", "TRUE"),
+    ("extra: shuffle_category_list", "A,B,C"),
+]
+
+OPTIONS_HEADERS = ["Id", "Text", "Category", "Description", "Image URL", "Gender"]
+
+def write_csv_blocks(path, election_id, num_questions, num_candidates,
+    separator=",", rand=random):
+    '''
+    Writes a csv-blocks file with a synthetic election, with the given number
+    of questions and candidates per question. Returns the number of csv rows
+    written.
+    '''
+    rows = []
+    params = dict(election_id=election_id)
+    rows.append(["#Election"])
+    rows.append(["Id", str(election_id)])
+    rows.extend([key, value % params] for key, value in ELECTION_FORM)
+    rows.append([])
+
+    for question_num in range(num_questions):
+        params = dict(question_num=question_num, max=min(3, num_candidates))
+        rows.append(["#Question"])
+        rows.extend([key, value % params] for key, value in QUESTION_FORM)
+        rows.append([])
+        rows.append(["@Options"])
+        rows.append(OPTIONS_HEADERS)
+        for candidate_id in range(num_candidates):
+            rows.append([
+                str(candidate_id),
+                "Candidate %d-%d" % (question_num, candidate_id),
+                rand.choice(["A", "B", "C"]),
+                "Candidate %d\ndescription" % candidate_id,
+                rand.choice(["", "https://example.com/%d.png" % candidate_id]),
+                rand.choice(["M", "H"])
+            ])
+        rows.append([])
+
+    with open(path, mode='w', encoding="utf-8", errors='strict', newline='') as f:
+        writer = csv.writer(f, delimiter=separator, quotechar='"', lineterminator="\n")
+        writer.writerows(rows)
+    return len(rows)
+
+def write_csv_blocks_dir(directory, num_elections, num_questions,
+    num_candidates, separator=",", seed=0):
+    '''
+    Writes num_elections csv-blocks files named <election id>.csv (or .tsv)
+    into directory. Returns the list of paths written and the total number of
+    csv rows.
+    '''
+    rand = random.Random(seed)
+    extension = ".tsv" if separator == "\t" else ".csv"
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    paths = []
+    num_rows = 0
+    for election_id in range(num_elections):
+        path = os.path.join(directory, str(election_id) + extension)
+        num_rows += write_csv_blocks(
+            path, election_id, num_questions, num_candidates, separator, rand)
+        paths.append(path)
+    return paths, num_rows
+
+def write_google_forms(path, num_elections, num_questions, num_candidates,
+    census_size, auth_method="email", seed=0):
+    '''
+    Writes a google forms csv export with one response (election) per row,
+    as read by import_election_csv.form_to_elections().
+    '''
+    rand = random.Random(seed)
+    keys = ["Título", "Descripción", "Comienzo", "Final", "Censo"]
+    for _ in range(num_questions):
+        keys.extend([
+            "Título",
+            "Descripción",
+            "Número de ganadores",
+            "Número máximo de opciones",
+            "Número mínimo de opciones",
+            "Orden aleatorio",
+            "Resultados",
+            "Opciones",
+            "¿Más preguntas?"
+        ])
+
+    with open(path, mode='w', encoding="utf-8", errors='strict', newline='') as f:
+        writer = csv.writer(f, delimiter=",", quotechar='"', lineterminator="\n")
+        writer.writerow(keys)
+        for election_num in range(num_elections):
+            if auth_method == "sms":
+                census = ["+3460%07d" % i for i in range(census_size)]
+            else:
+                census = [
+                    "voter%d.%d@example.com" % (election_num, i)
+                    for i in range(census_size)]
+            row = [
+                "Election %d" % election_num,
+                "Synthetic election %d" % election_num,
+                "10/10/2020 10:00:00",
+                "10/12/2020 10:00:00",
+                "\n".join(census)
+            ]
+            for question_num in range(num_questions):
+                row.extend([
+                    "Question %d" % question_num,
+                    "Synthetic question %d" % question_num,
+                    str(min(3, num_candidates)),
+                    str(min(3, num_candidates)),
+                    "0",
+                    rand.choice(["Aleatorio", "Ordenado"]),
+                    rand.choice(["Sobre votos totales", "Sobre votos válidos"]),
+                    "\n".join(
+                        "Candidate %d-%d" % (question_num, candidate_id)
+                        for candidate_id in range(num_candidates)),
+                    "Sí" if question_num < num_questions - 1 else "No"
+                ])
+            writer.writerow(row)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generates synthetic csv-blocks and google forms inputs.')
+    parser.add_argument('format', choices=['csv-blocks', 'tsv-blocks', 'csv-google-forms'],
+        help='format of the generated data')
+    parser.add_argument('output_path',
+        help='output directory for csv-blocks, output file for google forms')
+    parser.add_argument('-e', '--elections', type=int, default=100,
+        help='number of elections')
+    parser.add_argument('-q', '--questions', type=int, default=2,
+        help='number of questions per election')
+    parser.add_argument('-n', '--candidates', type=int, default=20,
+        help='number of candidates per question')
+    parser.add_argument('-C', '--census', type=int, default=1000,
+        help='census size per election, only for google forms')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    if args.format == 'csv-google-forms':
+        write_google_forms(args.output_path, args.elections, args.questions,
+            args.candidates, args.census, seed=args.seed)
+    else:
+        write_csv_blocks_dir(args.output_path, args.elections, args.questions,
+            args.candidates, "," if args.format == 'csv-blocks' else "\t",
+            seed=args.seed)
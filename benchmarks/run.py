@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+from utils.csvblocks import csv_to_blocks, Diagnostics
+from utils.json_serialize import serialize, serialize_to_file
+from utils.config_store import ElectionConfigStore
+from import_election_csv import (blocks_to_election, form_to_elections,
+                                 compile_extra_options, write_census)
+from benchmarks.generate import write_csv_blocks_dir, write_google_forms
+
+BENCHMARK_CONFIG = {
+    "authorities": ["authority1", "authority2"],
+    "director": "director",
+    "iam": {
+        "event_config": {
+            "auth_method": "email"
+        }
+    }
+}
+
+def measure(name, func, setup=None, rows=0, repeat=1, trace_memory=True):
+    '''
+    Measures the execution of func(setup()). The wall time is the best of
+    repeat runs without tracing, and the peak memory allocated by func is
+    measured with tracemalloc on an extra run, because tracing slows down the
+    execution a lot. setup is not included in any of the measures.
+    '''
+    if setup is None:
+        setup = lambda: None
+
+    wall_time = None
+    for _ in range(repeat):
+        data = setup()
+        start = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - start
+        if wall_time is None or elapsed < wall_time:
+            wall_time = elapsed
+
+    peak_memory = None
+    if trace_memory:
+        data = setup()
+        tracemalloc.start()
+        func(data)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    data = None
+
+    return dict(
+        name=name,
+        wall_time=wall_time,
+        rows=rows,
+        rows_per_second=rows / wall_time if wall_time > 0 else None,
+        peak_memory_bytes=peak_memory,
+        max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    )
+
+def run_csv_blocks(work_path, args):
+    '''
+    Benchmarks the csv-blocks import path: csv_to_blocks, blocks_to_election
+    and serializing the elections
+    '''
+    directory = os.path.join(work_path, "csv-blocks")
+    paths, num_rows = write_csv_blocks_dir(directory, args.elections,
+        args.questions, args.candidates, seed=args.seed)
+    num_answers = args.elections * args.questions * args.candidates
+
+    def parse_all(_):
+        return [
+            csv_to_blocks(path, diagnostics=Diagnostics())
+            for path in paths]
+
+    def build_all(all_blocks):
+        extra_options = compile_extra_options(BENCHMARK_CONFIG)
+        return [
+            blocks_to_election(blocks, BENCHMARK_CONFIG,
+                extra_options=extra_options)
+            for blocks in all_blocks]
+
+    def serialize_all(elections):
+        for election in elections:
+            serialize(election)
+
+    return [
+        measure("csv_to_blocks", parse_all, rows=num_rows,
+            repeat=args.repeat, trace_memory=args.memory),
+        measure("blocks_to_election", build_all,
+            setup=lambda: parse_all(None), rows=num_answers,
+            repeat=args.repeat, trace_memory=args.memory),
+        measure("serialize", serialize_all,
+            setup=lambda: build_all(parse_all(None)), rows=args.elections,
+            repeat=args.repeat, trace_memory=args.memory),
+    ]
+
+def run_google_forms(work_path, args):
+    '''
+    Benchmarks the google forms import path: form_to_elections and writing
+    the census of the elections
+    '''
+    path = os.path.join(work_path, "google-forms.csv")
+    write_google_forms(path, args.elections, args.questions, args.candidates,
+        args.census, seed=args.seed)
+
+    def convert(_):
+        return list(form_to_elections(path, ",", BENCHMARK_CONFIG, 0))
+
+    def write_all_census(elections):
+        census_path = os.path.join(work_path, "census.json")
+        for election in elections:
+            write_census(census_path, election['census'])
+
+    return [
+        measure("form_to_elections", convert,
+            rows=args.elections * (args.census + args.questions * args.candidates),
+            repeat=args.repeat, trace_memory=args.memory),
+        measure("write_census", write_all_census, setup=lambda: convert(None),
+            rows=args.elections * args.census,
+            repeat=args.repeat, trace_memory=args.memory),
+    ]
+
+def run_config_store(work_path, args):
+    '''
+    Benchmarks reading the <id>.config.json files of the elections, as
+    config_updates.py does, each of them args.config_reads times: parsing
+    the json every time, with an ElectionConfigStore, and with a new store
+    whose disk cache was filled by a previous run
+    '''
+    csv_path = os.path.join(work_path, "config-store-csv")
+    elections_path = os.path.join(work_path, "config-store-elections")
+    cache_path = os.path.join(work_path, "config-store-cache")
+    paths, _ = write_csv_blocks_dir(csv_path, args.elections,
+        args.questions, args.candidates, seed=args.seed)
+    os.makedirs(elections_path)
+    extra_options = compile_extra_options(BENCHMARK_CONFIG)
+    election_ids = []
+    for path in paths:
+        election = blocks_to_election(
+            csv_to_blocks(path, diagnostics=Diagnostics()), BENCHMARK_CONFIG,
+            extra_options=extra_options)
+        election_ids.append(election['id'])
+        config_path = os.path.join(
+            elections_path, "%d.config.json" % election['id'])
+        with open(config_path, mode='w', encoding="utf-8", errors='strict') as f:
+            serialize_to_file(dict(payload=dict(configuration=election)), f)
+    num_reads = len(election_ids) * args.config_reads
+
+    def parse_all(_):
+        for _ in range(args.config_reads):
+            for election_id in election_ids:
+                config_path = os.path.join(
+                    elections_path, "%d.config.json" % election_id)
+                with open(config_path, mode='r', encoding="utf-8", errors='strict') as f:
+                    json.loads(f.read())["payload"]['configuration']
+
+    def read_all(store):
+        for _ in range(args.config_reads):
+            for election_id in election_ids:
+                store.get(elections_path, election_id)
+
+    def warm_store():
+        read_all(ElectionConfigStore(cache_path=cache_path))
+        return ElectionConfigStore(cache_path=cache_path)
+
+    return [
+        measure("config json.loads", parse_all, rows=num_reads,
+            repeat=args.repeat, trace_memory=args.memory),
+        measure("config store", read_all, setup=ElectionConfigStore,
+            rows=num_reads, repeat=args.repeat, trace_memory=args.memory),
+        measure("config store disk", read_all, setup=warm_store,
+            rows=num_reads, repeat=args.repeat, trace_memory=args.memory),
+    ]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the csv-blocks and google forms import paths '
+                    'with synthetic data.')
+    parser.add_argument('-e', '--elections', type=int, default=100,
+        help='number of elections')
+    parser.add_argument('-q', '--questions', type=int, default=2,
+        help='number of questions per election')
+    parser.add_argument('-n', '--candidates', type=int, default=20,
+        help='number of candidates per question')
+    parser.add_argument('-C', '--census', type=int, default=1000,
+        help='census size per election, used in google forms')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+        help='number of timed runs per stage, the best one is reported')
+    parser.add_argument('--config-reads', type=int, default=4,
+        help='times each election config is read in the config store stages')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+        help="don't measure the peak memory with tracemalloc")
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('-o', '--output-path', default='benchmark-results.json',
+        help='path where the json results are written')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_path:
+        stages = (
+            run_csv_blocks(work_path, args) +
+            run_google_forms(work_path, args) +
+            run_config_store(work_path, args))
+
+    results = dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        parameters=dict(
+            elections=args.elections,
+            questions=args.questions,
+            candidates=args.candidates,
+            census=args.census,
+            config_reads=args.config_reads,
+            repeat=args.repeat,
+            seed=args.seed
+        ),
+        stages=stages
+    )
+
+    print("%-20s %12s %12s %16s %14s" % (
+        "stage", "time (s)", "rows", "rows/s", "peak mem (KB)"))
+    for stage in stages:
+        print("%-20s %12.4f %12d %16.1f %14s" % (
+            stage['name'],
+            stage['wall_time'],
+            stage['rows'],
+            stage['rows_per_second'] or 0,
+            "-" if stage['peak_memory_bytes'] is None else stage['peak_memory_bytes'] // 1024))
+
+    with open(args.output_path, mode='w', encoding="utf-8", errors='strict') as f:
+        f.write(serialize(results))
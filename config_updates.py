@@ -31,18 +31,23 @@ import traceback
 import subprocess
 import hashlib
 import collections
+import time
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import tempfile
 import traceback
+from contextlib import closing
 
 from datadiff import diff
 
-from utils.csvblocks import csv_to_blocks
+from utils.csvblocks import iter_csv_blocks, table_column
 from utils.json_serialize import serialize
 from utils.tree import (edges2simpletree, list_edges, list_leaves, list_all,
-                        get_list, get_ancestors)
+                        get_list, get_ancestors, get_all_ancestors)
 from utils.hashed_changes import hash_question
 from utils.deterministic_tar import deterministic_tar_open, deterministic_tar_add
+from utils.config_store import ElectionConfigStore
+from utils.results_cache import ResultsCache, remove_results, tally_pipes_version
 
 from shutil import copy2, rmtree
 import pyminizip
@@ -75,21 +80,27 @@ def get_changes_tree(changes):
     Given the changes configuration, generates a simple dict based tree
     with the ids of the changed elections
     '''
-    def get_parent(value):
-        return value['election_id']
-
-    def get_child(value):
-        return value.get('new_election_id', None)
-
-    edges = [(get_parent(val), get_child(val)) for val in changes]
+    election_ids = table_column(changes, 'election_id')
+    if None in election_ids:
+        raise Exception("Error: the changes have no election_id column")
+    edges = list(zip(
+        election_ids,
+        table_column(changes, 'new_election_id')))
     return edges2simpletree(edges)
 
 def get_changes_config(changes_path):
     '''
-    Given the path of the changes configuration
+    Given the path of the changes configuration, returns the rows of its first
+    block, stored by columns. The remaining blocks of the file, if any, are not
+    even parsed.
     '''
-    blocks = csv_to_blocks(path=changes_path, separator="\t")
-    return blocks[0]['values']
+    blocks = iter_csv_blocks(path=changes_path, separator="\t", columnar=True)
+    # closing the generator closes the file right away
+    with closing(blocks):
+        block = next(blocks, None)
+    if block is None:
+        raise Exception("Error: no changes block found in %s" % changes_path)
+    return block['values']
 
 def get_node_changes(tree, changes):
     '''
@@ -99,10 +110,12 @@ def get_node_changes(tree, changes):
     the changes list in order.
     '''
     node_changes = collections.defaultdict(list)
-    for change in changes:
-        key = change.get('new_election_id')
+    keys = zip(
+        table_column(changes, 'new_election_id'),
+        table_column(changes, 'election_id'))
+    for change, (key, election_id) in zip(changes, keys):
         if key in [None, '']:
-            key = change['election_id']
+            key = election_id
         node_changes[key].append(change)
     return node_changes
 
@@ -265,14 +278,15 @@ def download_elections(config, changes_path, elections_path, ids_path):
         with open(epath, mode='w', encoding="utf-8", errors='strict') as f:
             f.write(r.text)
 
+# election configs loaded in this run, see --config-cache-path
+ELECTION_CONFIGS = ElectionConfigStore()
+
 def get_election_config(elections_path, election_id):
     '''
-    boilerplate for getting election config
+    boilerplate for getting election config. Each config file is only parsed
+    once, and a new copy is returned each time.
     '''
-    election_path = os.path.join(elections_path, "%s.config.json" % election_id)
-    with open(election_path, mode='r', encoding="utf-8", errors='strict') as f:
-        election_config = json.loads(f.read())["payload"]['configuration']
-        return election_config
+    return ELECTION_CONFIGS.get(elections_path, election_id)
 
 def get_changes_func(func_name, module_path):
     '''
@@ -291,17 +305,46 @@ def check_change_applied(func_name, kwargs, election_id, election_config):
         fargs.update(kwargs)
     get_changes_func(func_name, 'utils.prechanges_check')(**fargs)
 
-def get_changes_chain_for_election_id(election_id, config, tree, node_changes):
+def derive_election_configs(tree, node_changes, election_ids, get_root_config,
+    mod_path):
     '''
-    Gets a complete list of changes to apply to an election
+    Calculates the config of each election applying the changes of the tree.
+    The tree is walked top-down: the config of a root election is its own config
+    as returned by get_root_config(election_id), and the config of any other
+    election is a copy of the config already calculated for its parent. Then the
+    changes of the election itself are applied using the functions in mod_path,
+    so that each change is applied only once.
+
+    Returns a dict with the config and the ancestors (including self) of each
+    election id.
     '''
-    changes_chain = []
-    # contains self
-    ancestors = get_ancestors(tree, election_id) + [election_id]
-
-    for ancestor_id in ancestors:
-        changes_chain = changes_chain + node_changes[ancestor_id]
-    return changes_chain, ancestors
+    all_ancestors = get_all_ancestors(tree)
+    calculated = dict()
+
+    def calculate(ancestors):
+        # configs are keyed by the full path, as an election can have more
+        # than one parent
+        key = tuple(ancestors)
+        if key not in calculated:
+            election_id = ancestors[-1]
+            if len(ancestors) == 1:
+                election_config = get_root_config(election_id)
+            else:
+                election_config = copy.deepcopy(calculate(ancestors[:-1]))
+            apply_election_changes(
+                election_id, election_config, node_changes[election_id],
+                mod_path)
+            calculated[key] = election_config
+        return calculated[key]
+
+    election_configs = dict()
+    for election_id in election_ids:
+        ancestors = all_ancestors.get(election_id, []) + [election_id]
+        election_configs[election_id] = dict(
+            config=calculate(ancestors),
+            ancestors=ancestors
+        )
+    return election_configs
 
 def curate_config(election_config):
   '''
@@ -329,13 +372,12 @@ def curate_config(election_config):
 def remove_accents(data):
     return ''.join(x for x in unicodedata.normalize('NFKD', data) if x in string.ascii_letters).lower()
 
-def apply_elections_changes(config, elections_path, ancestors, election_id,
-    election_changes):
+def apply_election_changes(election_id, election_config, election_changes,
+    mod_path):
     '''
-    Apply changes to the given election
+    Apply the changes to the given election config, using the change functions
+    in mod_path
     '''
-    election_config = get_election_config(elections_path, ancestors[0])
-    mod_path = 'utils.apply_election_changes'
     for change in election_changes:
         kwargs = dict(change=change, election_config=election_config)
         try:
@@ -393,12 +435,14 @@ def check_changes(config, changes_path, elections_path, ids_path):
             check_change_applied(change, kwargs, election_id, election_config)
 
     # check the remaining changes
+    calculated_elections = derive_election_configs(
+        tree,
+        node_changes,
+        election_ids,
+        lambda root_id: get_election_config(elections_path, root_id),
+        'utils.apply_election_changes')
     for election_id in election_ids:
-        election_changes, ancestors = get_changes_chain_for_election_id(
-            election_id, config, tree, node_changes)
-
-        calculated_election = apply_elections_changes(
-            config, elections_path, ancestors, election_id, election_changes)
+        calculated_election = calculated_elections[election_id]['config']
         check_diff_changes(elections_path, election_id, calculated_election)
 
         # check that all final elections have been tagged with the sex
@@ -434,6 +478,26 @@ def apply_results_config_prechanges(func_name, kwargs, ancestors, election_id,
     get_changes_func(func_name, 'utils.prechanges_results')(**fargs)
 
 
+def index_hashes(election_id, election_config):
+    '''
+    Given a hashed election config, returns an index of its questions and
+    answers by hash, so that they can be found without going through all of
+    them. Questions and answers are indexed separately, and for each hash there
+    is a list of (election_id, question_num, answer_id, text) tuples in the
+    same order they appear in the config. answer_id is None for questions,
+    and text is the question title.
+    '''
+    question_hashes = collections.defaultdict(list)
+    answer_hashes = collections.defaultdict(list)
+    questions = election_config['questions']
+    for question, question_num in zip(questions, range(len(questions))):
+        question_hashes[question['hash']].append(
+            (int(election_id), question_num, None, question['title']))
+        for answer in question['answers']:
+            answer_hashes[answer['hash']].append(
+                (int(election_id), question_num, answer['id'], answer['text']))
+    return dict(questions=question_hashes, answers=answer_hashes)
+
 def find_question_mappings(hashed_election_configs, ancestors, dest_question, dest_question_num):
     '''
     Given a hashed question, the ancestors and the configs of the ancestors,
@@ -454,17 +518,15 @@ def find_question_mappings(hashed_election_configs, ancestors, dest_question, de
     '''
     q_mappings = []
     for ancestor in ancestors:
-        election_config = hashed_election_configs[ancestor]['config']
-        questions = election_config['questions']
-        for question, question_num in zip(questions, range(len(questions))):
-            if question['hash'] == dest_question['hash']:
-                q_mappings.append({
-                    'source_election_id': int(ancestor),
-                    'source_question_num': question_num,
-                    'source_question_title': question['title'],
-                    'dest_question_num': dest_question_num,
-                    'dest_question_title': dest_question['title'],
-                })
+        hashes = hashed_election_configs[ancestor]['hashes']['questions']
+        for election_id, question_num, _, title in hashes.get(dest_question['hash'], []):
+            q_mappings.append({
+                'source_election_id': election_id,
+                'source_question_num': question_num,
+                'source_question_title': title,
+                'dest_question_num': dest_question_num,
+                'dest_question_title': dest_question['title'],
+            })
     return q_mappings
 
 
@@ -490,20 +552,17 @@ def find_answer_mappings(hashed_election_configs, ancestors, dest_answer, dest_q
     '''
     answer_mappings = []
     for ancestor in ancestors:
-        election_config = hashed_election_configs[ancestor]['config']
-        questions = election_config['questions']
-        for question, question_num in zip(questions, range(len(questions))):
-            for answer in question['answers']:
-                if answer['hash'] == dest_answer['hash']:
-                    answer_mappings.append({
-                        "source_election_id": int(ancestor),
-                        "source_question_num": question_num,
-                        "source_answer_id": answer['id'],
-                        "source_answer_text": answer['text'],
-                        "dest_question_num": dest_question_num,
-                        "dest_answer_id": dest_answer['id'],
-                        "dest_answer_text": dest_answer['text']
-                    })
+        hashes = hashed_election_configs[ancestor]['hashes']['answers']
+        for election_id, question_num, answer_id, text in hashes.get(dest_answer['hash'], []):
+            answer_mappings.append({
+                "source_election_id": election_id,
+                "source_question_num": question_num,
+                "source_answer_id": answer_id,
+                "source_answer_text": text,
+                "dest_question_num": dest_question_num,
+                "dest_answer_id": dest_answer['id'],
+                "dest_answer_text": dest_answer['text']
+            })
     return answer_mappings
 
 
@@ -540,14 +599,12 @@ def post_process_results_config(
         mappings = []
         qmappings = []
         for question, dest_question_num in zip(questions, range(len(questions))):
-          qmappings = qmappings + find_question_mappings(
-                hashed_election_configs, ancestors[:-1], question, dest_question_num)
+          qmappings.extend(find_question_mappings(
+                hashed_election_configs, ancestors[:-1], question, dest_question_num))
 
           for answer in question['answers']:
-            answer_mappings = find_answer_mappings(
-                hashed_election_configs, ancestors[:-1], answer, dest_question_num)
-            if len(answer_mappings) > 0:
-                mappings = mappings + answer_mappings
+            mappings.extend(find_answer_mappings(
+                hashed_election_configs, ancestors[:-1], answer, dest_question_num))
 
         results_config.append([
             "tally_pipes.pipes.multipart.question_totals_with_corrections",
@@ -619,33 +676,16 @@ def post_process_results_config(
             ])
 
 
-def apply_changes_hashing(
-    election_id,
-    election_config,
-    election_changes,
-    ancestors,
-    elections_path):
+def get_hashed_root_config(elections_path, election_id):
     '''
-    Applies the changes in the elections hashing the questions and answers in
-    a reproducible them, to be able to later on backtrack the original answers
-    and questions
+    Returns the config of a root election, hashing all the questions and
+    answers in a reproducible way, to be able to later on backtrack the original
+    answers and questions after applying the changes
     '''
-
-    # first of all, hash all the questions and answers in a reproducible way
+    election_config = get_election_config(elections_path, election_id)
     questions = election_config['questions']
     for question, i in zip(questions, range(len(questions))):
-        hash_question(question, ancestors[0], i)
-
-    mod_path = 'utils.hashed_changes'
-    for change in election_changes:
-        kwargs = dict(change=change, election_config=election_config)
-        try:
-            get_changes_func(change['action'], mod_path)(**kwargs)
-        except:
-            print("Error processing election(%s) change(%s):" % (
-                election_id, change['action']))
-            traceback.print_exc()
-    election_config['id'] = int(election_id)
+        hash_question(question, election_id, i)
     return election_config
 
 def parse_parity_config(config):
@@ -711,21 +751,15 @@ def write_tally_pipes_files(config, changes_path, elections_path, ids_path):
     # calculate a configuration for each election, including middle steps, so
     # that later on the answers between election can be tracked and collected
     # by hash
-    hashed_election_configs = dict()
-    for election_id in election_ids:
-        election_changes, ancestors = get_changes_chain_for_election_id(
-            election_id, config, tree, node_changes)
-        election_config = get_election_config(elections_path, ancestors[0])
-        apply_changes_hashing(
-          election_id,
-          election_config,
-          election_changes,
-          ancestors,
-          elections_path)
-        hashed_election_configs[election_id] = dict(
-            config=election_config,
-            ancestors=ancestors
-        )
+    hashed_election_configs = derive_election_configs(
+        tree,
+        node_changes,
+        election_ids,
+        lambda root_id: get_hashed_root_config(elections_path, root_id),
+        'utils.hashed_changes')
+    for election_id, hashed_election in hashed_election_configs.items():
+        hashed_election['hashes'] = index_hashes(
+            election_id, hashed_election['config'])
 
     # iterate and process the results config for all final elections
     for election_id in final_ids:
@@ -778,16 +812,14 @@ def hash_file(filePath):
     return hasha.hexdigest()
 
 def create_pdf(election_id, cfg_res_postfix, elections_path, bin_path, oformat, tallies, only_check=False):
-    cmd = "%s -t %s -c %s -o %s -eid %d" % (
-        bin_path,
-        " ".join(tallies),
-        os.path.join(elections_path, str(election_id) + cfg_res_postfix),
-        'pdf',
-        election_id)
+    cmd, _ = results_command(tallies, election_id, cfg_res_postfix,
+        elections_path, bin_path, 'pdf')
 
     print(cmd)
     if only_check:
         return
+    # tally-pipes writes the pdf in place, which could be a link to the cache
+    remove_results(elections_path, election_id, ['pdf'])
     # f_path = os.path.join(elections_path, str(last_id) + ".results.pdf" + oformat)
     subprocess.check_call(cmd, stdout=sys.stdout, stderr=sys.stderr, shell=True)
 
@@ -822,9 +854,88 @@ def generate_pdf(config, tree_path, elections_path):
         print("eids = %s: creating pdf.. " % json.dumps(eids), end="")
         create_pdf(last_id, cfg_res_postfix, elections_path, bin_path, "pdf", tallies)
 
-def calculate_results(config, tree_path, elections_path, check):
+RESULTS_FORMATS = ["json", "pdf", "tsv", "pretty"]
+
+def results_command(tallies, last_id, cfg_res_postfix, elections_path, bin_path,
+    oformat, only_check=False):
+    '''
+    Returns the tally-pipes command that calculates the results of an election
+    in the given format, and the path of the file where its output should be
+    written, or None if it shouldn't be written to a file.
+    '''
+    config_path = os.path.join(elections_path, str(last_id) + cfg_res_postfix)
+    if oformat == "pdf":
+        cmd = "%s -t %s -c %s -o %s -eid %d" % (
+            bin_path, " ".join(tallies), config_path, 'pdf', last_id)
+        return cmd, None
+    if only_check:
+        cmd = "%s -t %s -c %s -o %s" % (
+            bin_path, " ".join(tallies), config_path, oformat)
+        return cmd, None
+    cmd = "%s -t %s -c %s -s -o %s" % (
+        bin_path, " ".join(tallies), config_path, oformat)
+    f_path = os.path.join(elections_path, str(last_id) + ".results." + oformat)
+    return cmd, f_path
+
+def calculate_election_results(eids, tallies, cfg_res_postfix, elections_path,
+    bin_path, check, concurrent_formats=False):
+    '''
+    Calculates the results of the last election of a chain, writing the
+    commands and anything tally-pipes prints other than the results to
+    <id>.results.log in elections_path. The formats are calculated one after
+    the other, stopping at the first failure, or all at the same time if
+    concurrent_formats is set.
+
+    Returns a dict with the failed formats and the elapsed time.
     '''
-    Launches tally-pipes for those elections that do have a tally
+    last_id = eids[-1]
+    start = time.time()
+    formats = ["json"] if check else RESULTS_FORMATS
+    if not check:
+        remove_results(elections_path, last_id, formats)
+    failed = []
+    log_path = os.path.join(elections_path, "%d.results.log" % last_id)
+    with open(log_path, mode='w', encoding="utf-8", errors='strict') as log:
+        running = []
+        for oformat in formats:
+            cmd, f_path = results_command(tallies, last_id, cfg_res_postfix,
+                elections_path, bin_path, oformat, only_check=check)
+            log.write(cmd + "\n")
+            log.flush()
+            output = log
+            if f_path is not None:
+                output = open(f_path, mode='w', encoding="utf-8", errors='strict')
+            running.append((oformat, output,
+                subprocess.Popen(cmd, stdout=output, stderr=log, shell=True)))
+            if not concurrent_formats:
+                oformat, output, process = running.pop()
+                if output is not log:
+                    output.close()
+                if process.wait() != 0:
+                    failed.append(oformat)
+                    break
+
+        for oformat, output, process in running:
+            if process.wait() != 0:
+                failed.append(oformat)
+            if output is not log:
+                output.close()
+
+        for oformat in failed:
+            log.write("error calculating the %s results\n" % oformat)
+
+    return dict(failed=failed, elapsed=time.time() - start, log_path=log_path)
+
+def calculate_results(config, tree_path, elections_path, check, jobs=1,
+    concurrent_formats=False, results_cache=None):
+    '''
+    Launches tally-pipes for those elections that do have a tally. With more
+    than one job, or with concurrent_formats, the elections are calculated in
+    parallel with per-election log files, and a summary is printed at the end.
+
+    If a ResultsCache is given, the results of the elections whose tallies,
+    results config and tally-pipes didn't change are taken from it instead of
+    being calculated again, and the new results are added to it.
     '''
     cfg_res_postfix = '.config.results.json'
     ids_w_res_config = [
@@ -836,6 +947,11 @@ def calculate_results(config, tree_path, elections_path, check):
         tree = [[int(a.strip()) for a in line.strip().split(",")] for line in f]
 
     priv_path = config["ballot_box_private_datastore_path"]
+    jobs = jobs if jobs > 0 else os.cpu_count()
+    parallel = jobs > 1 or concurrent_formats
+    bin_path = config['tally_pipes_bin_path']
+    pending = []
+    num_cached = 0
     for eids in tree:
         # check for config file
         last_id = eids[-1]
@@ -857,35 +973,106 @@ def calculate_results(config, tree_path, elections_path, check):
         if len(tallies) != len(eids):
             continue
 
+        cache_key = None
+        if results_cache is not None and not check:
+            cache_key = results_cache.key(
+                tallies,
+                os.path.join(elections_path, str(last_id) + cfg_res_postfix),
+                bin_path,
+                RESULTS_FORMATS)
+            if results_cache.restore(
+                cache_key, elections_path, last_id, RESULTS_FORMATS):
+                print("eids = %s: results restored from cache" % json.dumps(eids))
+                num_cached += 1
+                continue
+
+        if parallel:
+            pending.append((eids, tallies, cache_key))
+            continue
+
         print("eids = %s: calculating results.. " % json.dumps(eids), end="")
 
         # got the tallies, the config file --> calculate results
         def create_results(last_id, cfg_res_postfix, elections_path, bin_path, oformat, only_check=False):
-            cmd = "%s -t %s -c %s -s -o %s" % (
-                bin_path,
-                " ".join(tallies),
-                os.path.join(elections_path, str(last_id) + cfg_res_postfix),
-                oformat)
-            if only_check:
-                print(cmd)
-                cmd = cmd.replace("-s ", "")
+            # the command printed is exactly the one executed, which in check
+            # mode doesn't save the results
+            cmd, f_path = results_command(tallies, last_id, cfg_res_postfix,
+                elections_path, bin_path, oformat, only_check=only_check)
             print(oformat, end=' ')
-            if only_check:
+            print(cmd)
+            if f_path is None:
                 subprocess.check_call(cmd, stderr=sys.stderr, shell=True)
                 return
-            f_path = os.path.join(elections_path, str(last_id) + ".results." + oformat)
+            remove_results(elections_path, last_id, [oformat])
             with open(f_path, mode='w', encoding="utf-8", errors='strict') as f:
-                print(cmd)
                 subprocess.check_call(cmd, stdout=f, stderr=sys.stderr, shell=True)
 
-        bin_path = config['tally_pipes_bin_path']
         create_results(last_id, cfg_res_postfix, elections_path, bin_path, "json", only_check=check)
         if not check:
             create_pdf(last_id, cfg_res_postfix, elections_path, bin_path, "pdf", tallies)
             create_results(last_id, cfg_res_postfix, elections_path, bin_path, "tsv")
             create_results(last_id, cfg_res_postfix, elections_path, bin_path, "pretty")
+        if cache_key is not None:
+            results_cache.store(cache_key, elections_path, last_id, RESULTS_FORMATS)
         print()
 
+    def print_cache_stats():
+        if results_cache is not None and not check:
+            print("results cache: %d hits, %d misses" % (
+                results_cache.stats['hits'], results_cache.stats['misses']))
+
+    if not parallel:
+        print_cache_stats()
+        return
+
+    # tally-pipes runs in its own processes, the threads only wait for them
+    summary = dict()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = dict(
+            (executor.submit(
+                calculate_election_results, eids, tallies, cfg_res_postfix,
+                elections_path, bin_path, check, concurrent_formats),
+             (eids, cache_key))
+            for eids, tallies, cache_key in pending)
+        for future in as_completed(futures):
+            eids, cache_key = futures[future]
+            try:
+                status = future.result()
+            except Exception:
+                print("eids = %s: error launching tally-pipes:" % json.dumps(eids))
+                traceback.print_exc()
+                status = dict(failed=RESULTS_FORMATS, elapsed=0, log_path=None)
+            summary[eids[-1]] = status
+            if status['log_path'] is None:
+                continue
+            if len(status['failed']) > 0:
+                print("eids = %s: error calculating %s results, see %s" % (
+                    json.dumps(eids), ", ".join(status['failed']),
+                    status['log_path']))
+            else:
+                print("eids = %s: results calculated in %.1fs" % (
+                    json.dumps(eids), status['elapsed']))
+                if cache_key is not None:
+                    results_cache.store(
+                        cache_key, elections_path, eids[-1], RESULTS_FORMATS)
+
+    print("\n%-12s %-24s %10s" % ("election", "status", "time (s)"))
+    num_failed = 0
+    for eids, tallies, cache_key in pending:
+        status = summary[eids[-1]]
+        if len(status['failed']) > 0:
+            num_failed += 1
+            text = "failed: " + ",".join(status['failed'])
+        else:
+            text = "ok"
+        print("%-12d %-24s %10.1f" % (eids[-1], text, status['elapsed']))
+    print("%d elections calculated, %d failed, %d restored from cache, %d skipped" % (
+        len(pending) - num_failed, num_failed, num_cached,
+        len(tree) - len(pending) - num_cached))
+    print_cache_stats()
+    if num_failed > 0:
+        raise Exception("error calculating the results of %d elections" % num_failed)
+
 def verify_results(elections_path):
     election_config_file = 'election_config.json'
     election_ids_file = 'election_ids.txt'
@@ -1100,6 +1287,33 @@ if __name__ == '__main__':
         help='path where to save the tallies',
         default=None)
 
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='number of elections whose results are calculated in parallel, 0 to use all the cpus',
+        default=1)
+
+    parser.add_argument(
+        '--concurrent-formats',
+        action='store_true',
+        help='calculate the json, pdf, tsv and pretty results of each election at the same time')
+
+    parser.add_argument(
+        '--results-cache-path',
+        help='directory where the results are cached, to calculate them only when their tallies, config or tally-pipes change',
+        default=None)
+
+    parser.add_argument(
+        '--results-cache-link',
+        action='store_true',
+        help='hard link the cached results instead of copying them, to save space. Results are always removed before writing them, so the cache is not modified')
+
+    parser.add_argument(
+        '--config-cache-path',
+        help='directory where the parsed election configs are cached between runs',
+        default=None)
+
     parser.add_argument(
         '-a',
         '--action',
@@ -1126,6 +1340,7 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
     config = None
+    ELECTION_CONFIGS.cache_path = args.config_cache_path
 
     if 'verify_results' != args.action:
         if args.config_path is None:
@@ -1168,14 +1383,22 @@ if __name__ == '__main__':
             elections_path_check(os.R_OK)
             check_changes(config, args.changes_path, args.elections_path, args.ids_path)
         elif args.action == 'calculate_results':
-            calculate_results(config, args.tree_path, args.elections_path, check=False)
+            results_cache = None
+            if args.results_cache_path is not None:
+                results_cache = ResultsCache(
+                    args.results_cache_path, link=args.results_cache_link,
+                    tally_pipes_version=tally_pipes_version(config))
+            calculate_results(config, args.tree_path, args.elections_path, check=False,
+                jobs=args.jobs, concurrent_formats=args.concurrent_formats,
+                results_cache=results_cache)
         elif args.action == 'verify_results':
             verify_results(args.elections_path)
         elif args.action == 'create_verifiable_results':
             elections_path_check(os.W_OK)
             create_verifiable_results(config, args.elections_path, args.ids_path, args.tallies_path, args.password)
         elif args.action == 'check_results':
-            calculate_results(config, args.tree_path, args.elections_path, check=True)
+            calculate_results(config, args.tree_path, args.elections_path, check=True,
+                jobs=args.jobs, concurrent_formats=args.concurrent_formats)
         elif args.action == 'tar_tallies':
             tar_tallies(config, args.tree_path, args.elections_path, args.tallies_path)
         elif args.action == 'count_votes':
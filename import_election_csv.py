@@ -16,16 +16,29 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
 import json
 import csv
 import os
-import copy
-import operator
+import hashlib
 import argparse
+import traceback
+from io import StringIO
+from copy import deepcopy
+from functools import lru_cache
+from collections import deque
+from contextlib import redirect_stdout, closing, contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
-from utils.csvblocks import csv_to_blocks
-from utils.json_serialize import serialize
+from utils.csvblocks import (iter_csv_blocks, get_diagnostics, open_csv_file,
+                             strip_compressed_extension, FormValues,
+                             WARNINGS_MODES)
+from utils.hashing import load_manifest, save_manifest, file_manifest_entry
+from utils.json_serialize import (serialize_to_file, serialize_list_to_file,
+                                  serialize_flat)
+from utils.bundle import open_bundle, BUNDLE_FORMATS
+from utils.watch import get_watcher, wait_changes
 
 
 def iget(d, key, default):
@@ -41,8 +54,14 @@ def iget(d, key, default):
     :param key: this is the key to search
     :param default: this is the default value to return if key isn't in the
     dict
+
+    The values of csv-blocks Forms are FormValues, which have an index of
+    their keys to find them without scanning.
     '''
 
+    if isinstance(d, FormValues):
+        return d.iget(key, default)
+
     real_key = key
     keyl = key.lower()
     for k in d.keys():
@@ -51,48 +70,60 @@ def iget(d, key, default):
     return d.get(real_key, default)
 
 
-BASE_ELECTION = {
-    "id": -1,
-    "title": "",
-    "description": "",
-    "layout": "",
-    "presentation": {
-        "share_text": [
-        {
-          "network": "Twitter",
-          "button_text": "",
-          "social_message": "I have just voted in election __URL__, you can too! #sequent"
+def new_election():
+    '''
+    Returns a new election with the default values
+    '''
+    return {
+        "id": -1,
+        "title": "",
+        "description": "",
+        "layout": "",
+        "presentation": {
+            "share_text": [
+            {
+              "network": "Twitter",
+              "button_text": "",
+              "social_message": "I have just voted in election __URL__, you can too! #sequent"
+            },
+            {
+              "network": "Facebook",
+              "button_text": "",
+              "social_message": "__URL__"
+            }
+          ],
+            "theme": 'default',
+            "urls": [],
+            "theme_css": "",
+            "extra_options": {}
         },
-        {
-          "network": "Facebook",
-          "button_text": "",
-          "social_message": "__URL__"
-        }
-      ],
-        "theme": 'default',
-        "urls": [],
-        "theme_css": "",
-        "extra_options": {}
-    },
-    "end_date": "",
-    "start_date": "",
-    "real": True,
-    "questions": []
-}
+        "end_date": "",
+        "start_date": "",
+        "real": True,
+        "questions": []
+    }
 
-BASE_QUESTION = {
-    "description": "",
-    "layout": 'simple',
-    "max": 1,
-    "min": 0,
-    "num_winners": 1,
-    "title": "",
-    "randomize_answer_order": True,
-    "tally_type": "plurality-at-large",
-    "answer_total_votes_percentage": "over-total-votes",
-    "extra_options": {},
-    "answers": []
-}
+def new_question():
+    '''
+    Returns a new question with the default values
+    '''
+    return {
+        "description": "",
+        "layout": 'simple',
+        "max": 1,
+        "min": 0,
+        "num_winners": 1,
+        "title": "",
+        "randomize_answer_order": True,
+        "tally_type": "plurality-at-large",
+        "answer_total_votes_percentage": "over-total-votes",
+        "extra_options": {},
+        "answers": []
+    }
+
+BASE_ELECTION = new_election()
+
+BASE_QUESTION = new_question()
 
 BASE_ANSWER = {
     "id": -1,
@@ -112,40 +143,275 @@ def parse_list(s):
 def parse_bool(s):
     return s == "TRUE"
 
-def parse_extra(q):
-  val = dict(
-      (key.replace("extra: ", ""), value)
-      for key, value in q.items() if key.startswith("extra: ")
-  )
-  if "success_screen__hide_download_ballot_ticket" in val:
-      val["success_screen__hide_download_ballot_ticket"] = parse_bool(
-          val["success_screen__hide_download_ballot_ticket"]
-      )
-  if "shuffle_category_list" in val:
-      val["shuffle_category_list"] = parse_list(val["shuffle_category_list"])
-  if "shuffle_categories" in val:
-      val["shuffle_categories"] = parse_bool(val["shuffle_categories"])
-  if "shuffle_all_options" in val:
-      val["shuffle_all_options"] = parse_bool(val["shuffle_all_options"])
-  if "select_all_category_clicks" in val:
-      val["select_all_category_clicks"] = parse_int(val["select_all_category_clicks"])
-  if "answer_group_columns_size" in val:
-      val["answer_group_columns_size"] = parse_int(val["answer_group_columns_size"])
-  if "answer_columns_size" in val:
-      val["answer_columns_size"] = parse_int(val["answer_columns_size"])
+def parse_str(s):
+    return s
+
+# matched against the whole value, so that trailing newlines are rejected
+DATE_TIME_RE = re.compile(
+    r"(\d{1,2})/(\d{1,2})/(\d{4})\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?")
+
+@lru_cache(maxsize=4096)
+def parse_date_time(value, month_first=False, require_seconds=False):
+    '''
+    Parses a date time in dd/mm/yyyy hh:mm[:ss] format, or mm/dd/yyyy
+    hh:mm[:ss] if month_first is set, like google forms dates. The seconds
+    are mandatory if require_seconds is set. Results are cached, because in
+    bulk imports most elections share the same dates.
+
+    Raises a ValueError explaining what's wrong with the value.
+    '''
+    expected = "%s hh:mm%s" % (
+        "mm/dd/yyyy" if month_first else "dd/mm/yyyy",
+        ":ss" if require_seconds else "[:ss]")
+    match = DATE_TIME_RE.fullmatch(value)
+    if match is None or (require_seconds and match.group(6) is None):
+        raise ValueError(
+            "invalid date time '%s', expected %s" % (value, expected))
+
+    first, second, year, hour, minute, second_value = match.groups()
+    month, day = (first, second) if month_first else (second, first)
+    try:
+        return datetime(
+            int(year), int(month), int(day), int(hour), int(minute),
+            int(second_value or 0))
+    except ValueError as error:
+        raise ValueError(
+            "invalid date time '%s', %s" % (value, error)) from None
+
+EXTRA_OPTION_PREFIX = "extra: "
+
+EXTRA_OPTION_PARSERS = {
+    "str": parse_str,
+    "int": parse_int,
+    "list": parse_list,
+    "bool": parse_bool
+}
+
+EXTRA_OPTION_SCOPES = ["election", "question"]
+
+# marks the extra options without a default, which are left out when they are
+# not set
+NO_DEFAULT = object()
+
+# typed extra options, as (name, type, scope[, default]), where scope says if
+# the default applies to the extra options of the election or of each
+# question. Options not listed here are kept as strings, and the types apply
+# in both scopes. More can be added with the "extra_options" key of the
+# config, using the same format
+EXTRA_OPTIONS = [
+    ("success_screen__hide_download_ballot_ticket", "bool", "election"),
+    ("shuffle_category_list", "list", "question"),
+    ("shuffle_categories", "bool", "question"),
+    ("shuffle_all_options", "bool", "question"),
+    ("select_all_category_clicks", "int", "question"),
+    ("answer_group_columns_size", "int", "question"),
+    ("answer_columns_size", "int", "question"),
+]
+
+def compile_extra_options(config=None):
+    '''
+    Compiles the typed extra options declarations, the ones in EXTRA_OPTIONS
+    plus the ones in the "extra_options" key of the config, which override
+    them. Returns a tuple (parsers, defaults), where parsers maps each option
+    name to its parser and defaults maps each scope to the (name, default) of
+    its options with a default.
+
+    Meant to be called once per import, as the result can be used for all
+    the elections.
+    '''
+    declarations = list(EXTRA_OPTIONS)
+    if config is not None:
+        declarations += [tuple(option) for option in config.get('extra_options', [])]
+
+    parsers = dict()
+    scope_defaults = dict((scope, dict()) for scope in EXTRA_OPTION_SCOPES)
+    for declaration in declarations:
+        if len(declaration) == 3:
+            name, option_type, scope = declaration
+            default = NO_DEFAULT
+        elif len(declaration) == 4:
+            name, option_type, scope, default = declaration
+        else:
+            raise Exception(
+                "invalid extra option %s, expected [name, type, scope] or "
+                "[name, type, scope, default]" % json.dumps(declaration))
+        if option_type not in EXTRA_OPTION_PARSERS:
+            raise Exception(
+                "invalid type '%s' for extra option '%s', valid types: %s" % (
+                    option_type, name, ", ".join(EXTRA_OPTION_PARSERS.keys())))
+        if scope not in EXTRA_OPTION_SCOPES:
+            raise Exception(
+                "invalid scope '%s' for extra option '%s', valid scopes: %s" % (
+                    scope, name, ", ".join(EXTRA_OPTION_SCOPES)))
+        parsers[name] = EXTRA_OPTION_PARSERS[option_type]
+        # a declaration replaces the defaults of the previous ones
+        for defaults in scope_defaults.values():
+            defaults.pop(name, None)
+        if default is not NO_DEFAULT:
+            scope_defaults[scope][name] = default
+    return parsers, dict(
+        (scope, list(defaults.items()))
+        for scope, defaults in scope_defaults.items())
+
+def parse_extra(q, scope, extra_options=None):
+  '''
+  Returns the extra options of a question or election, as set by scope,
+  which are the keys starting with "extra: ", converted to their type.
+  extra_options is the result of compile_extra_options(), compiled with no
+  config by default.
+  '''
+  if extra_options is None:
+      extra_options = DEFAULT_EXTRA_OPTIONS
+  parsers, scope_defaults = extra_options
+  prefix_len = len(EXTRA_OPTION_PREFIX)
+
+  val = dict()
+  for key, value in q.items():
+      if key.startswith(EXTRA_OPTION_PREFIX):
+          name = key[prefix_len:]
+          parser = parsers.get(name, parse_str)
+          val[name] = parser(value)
+  for name, default in scope_defaults[scope]:
+      if name not in val:
+          # defaults like lists are copied, so that the elections don't
+          # share them
+          val[name] = deepcopy(default)
 
   return val
 
-def blocks_to_election(blocks, config, add_to_id=0):
+DEFAULT_EXTRA_OPTIONS = compile_extra_options()
+
+class ElectionValidationError(Exception):
     '''
-    Parses a list of blocks into an election
+    Raised by blocks_to_election when the election has errors. issues has the
+    list of all the problems found, as returned by validate_question().
     '''
+    def __init__(self, issues):
+        self.issues = issues
+        super(ElectionValidationError, self).__init__(
+            "invalid election:\n" + "\n".join(
+                issue['message'] for issue in issues))
 
-    # convert blocks into a more convenient structure
-    election = blocks[0]['values']
+def validation_issue(level, code, question_num, question_title, message, **details):
+    '''
+    Creates a validation issue. level is either "error", which makes the
+    election invalid, or "warning".
+    '''
+    return dict(
+        level=level,
+        code=code,
+        question_num=question_num,
+        question_title=question_title,
+        message=message,
+        **details
+    )
 
-    blocks.pop(0)
+def validate_question(question_num, question, strict=False):
+    '''
+    Validates a question of an election, before max and num_winners are
+    capped to the number of answers. The answers are indexed in a single pass
+    and a list with all the issues found is returned.
+
+    Invalid min, max and num_winners bounds and duplicated option ids are
+    only warnings, because they were always accepted, unless strict is set.
+    '''
+    issues = []
+    strict_level = "error" if strict else "warning"
+    title = question['title']
+    answers = question['answers']
+
+    def issue(level, code, message, **details):
+        issues.append(validation_issue(
+            level, code, question_num, title,
+            "%s in question %d '%s': %s" % (
+                level.upper(), question_num, title, message),
+            **details))
+
+    text_ids = dict()
+    id_positions = dict()
+    for position, answer in enumerate(answers):
+        text_ids.setdefault(answer['text'], []).append(answer['id'])
+        id_positions.setdefault(answer['id'], []).append(position)
+        if answer['id'] != answer['sort_order']:
+            issue("warning", "id_sort_order_mismatch",
+                "answer '%s' has id %d but sort_order %d" % (
+                    answer['text'], answer['id'], answer['sort_order']),
+                answer_id=answer['id'], sort_order=answer['sort_order'])
+
+    for text, ids in text_ids.items():
+        if len(ids) > 1:
+            issue("error", "duplicated_answer_text",
+                "duplicated option '%s' with ids %s" % (text, ids),
+                answer_text=text, answer_ids=ids)
+
+    for answer_id, positions in id_positions.items():
+        if len(positions) > 1:
+            issue(strict_level, "duplicated_answer_id",
+                "duplicated option id %d" % answer_id,
+                answer_id=answer_id)
+
+    if question['min'] < 0:
+        issue(strict_level, "invalid_min",
+            "minimum choices %d is negative" % question['min'])
+    if question['min'] > question['max']:
+        issue(strict_level, "min_greater_than_max",
+            "minimum choices %d is greater than maximum choices %d" % (
+                question['min'], question['max']))
+    if question['min'] > len(answers):
+        issue(strict_level, "min_greater_than_answers",
+            "minimum choices %d is greater than the number of options %d" % (
+                question['min'], len(answers)))
+    if question['max'] < 1:
+        issue(strict_level, "invalid_max",
+            "maximum choices %d is lower than 1" % question['max'])
+    if question['num_winners'] < 1:
+        issue(strict_level, "invalid_num_winners",
+            "number of winners %d is lower than 1" % question['num_winners'])
+    if len(answers) == 0:
+        issue("warning", "no_answers", "the question has no options")
+
+    return issues
+
+DEFAULT_START_DATE = datetime(2015, 10, 10, 10, 10)
+
+def import_report(diagnostics, issues=None):
+    '''
+    Returns the json warnings report of an imported file: the csv warnings
+    collected in diagnostics, plus the validation issues of the election
+    '''
+    report = diagnostics.report()
+    report['validation'] = issues if issues is not None else []
+    return report
+
+def has_warnings(report):
+    return report['total'] > 0 or len(report['validation']) > 0
+
+def blocks_to_election(blocks, config, add_to_id=0, extra_options=None,
+    strict=False, issues=None):
+    '''
+    Parses a list of blocks into an election. blocks can be any iterable, like
+    the generator returned by iter_csv_blocks(), in which case the blocks are
+    consumed one question at a time.
+
+    extra_options are the typed extra options, as returned by
+    compile_extra_options(). By default they are compiled from config, which
+    should be avoided when importing many elections with the same config.
+
+    All the questions are validated with validate_question(), see strict.
+    If issues is a list, all the issues found are appended to it, otherwise
+    the warnings are printed. If there's any error an ElectionValidationError
+    with all the issues found is raised once the whole election has been read.
+    '''
+
+    # convert blocks into a more convenient structure
+    blocks = iter(blocks)
+    election = next(blocks)['values']
     questions = []
+    print_warnings = issues is None
+    if issues is None:
+        issues = []
+    if extra_options is None:
+        extra_options = compile_extra_options(config)
 
     def get_answer_id(answer):
         return answer['Id']
@@ -161,7 +427,8 @@ def blocks_to_election(blocks, config, add_to_id=0):
 
         return key + value.strip()
 
-    for question, options in zip(blocks[0::2], blocks[1::2]):
+    # each question is a Form block followed by its options Table block
+    for question, options in zip(blocks, blocks):
         q = question['values']
         q['options'] = options['values']
 
@@ -175,7 +442,7 @@ def blocks_to_election(blocks, config, add_to_id=0):
             "randomize_answer_order": parse_bool(q.get("Randomize options order", False)),
             "tally_type": q.get("Voting system", "plurality-at-large"),
             "answer_total_votes_percentage": q["Totals"],
-            "extra_options": parse_extra(q),
+            "extra_options": parse_extra(q, "question", extra_options),
             "answers": [
               {
                   "id": int(get_answer_id(answer)),
@@ -199,21 +466,9 @@ def blocks_to_election(blocks, config, add_to_id=0):
         }
 
         # check answers
-        try:
-          assert len(data['answers']) == len(set(list(map(operator.itemgetter('text'), data['answers']))))
-        except Exception as e:
-          print("duplicated options in question '%s':" % q["Title"])
-          l = list(map(operator.itemgetter('text'), data['answers']))
-          print(set([x for x in l if l.count(x) > 1]))
-          raise e
+        issues.extend(validate_question(len(questions), data, strict))
         data['max'] = min(data['max'], len(data['answers']))
         data['num_winners'] = min(data['num_winners'], len(data['answers']))
-        for answ in data['answers']:
-            try:
-               assert answ['id'] == answ['sort_order']
-            except:
-               print(answ)
-
 
         questions.append(data)
 
@@ -223,12 +478,22 @@ def blocks_to_election(blocks, config, add_to_id=0):
 
         return dictionary[key]
 
-    start_date = datetime.strptime("10/10/2015 10:10", "%d/%m/%Y %H:%M")
+    start_date = DEFAULT_START_DATE
     if len(election["Start date time"]) > 0:
         try:
-            start_date = datetime.strptime(election["Start date time"], "%d/%m/%Y %H:%M:%S")
-        except:
-            start_date = datetime.strptime(election["Start date time"], "%d/%m/%Y %H:%M")
+            start_date = parse_date_time(election["Start date time"])
+        except ValueError as error:
+            issues.append(validation_issue(
+                "error", "invalid_start_date", None, None,
+                "ERROR in election: start %s" % error,
+                value=election["Start date time"]))
+
+    if print_warnings:
+        for issue in issues:
+            if issue['level'] == "warning":
+                print(issue['message'])
+    if any(issue['level'] == "error" for issue in issues):
+        raise ElectionValidationError(issues)
 
     ret = {
         "id": int(election['Id']) + add_to_id,
@@ -253,7 +518,7 @@ def blocks_to_election(blocks, config, add_to_id=0):
             "theme": election.get('Theme', 'default'),
             "urls": [],
             "theme_css": "",
-            "extra_options": parse_extra(election),
+            "extra_options": parse_extra(election, "election", extra_options),
             "show_login_link_on_home": parse_bool(iget(election, 'login link on home', False)),
         },
         "end_date": (start_date + timedelta(hours=int(get_def(election, 'Duration in hours', '24')))).isoformat() + ".001",
@@ -263,63 +528,164 @@ def blocks_to_election(blocks, config, add_to_id=0):
     }
     return ret
 
+def iter_census(value, auth_method):
+    '''
+    Iterates the census entries of a google forms census cell, which has one
+    voter per line, without splitting the whole cell in memory
+    '''
+    key = "tlf" if auth_method == "sms" else "email"
+    start = 0
+    while start <= len(value):
+        end = value.find("\n", start)
+        if end == -1:
+            end = len(value)
+        yield {key: value[start:end]}
+        start = end + 1
+
+def unique_census(census, counts, jsonl_file=None):
+    '''
+    Iterates the census entries skipping the duplicated ones, and counts the
+    entries read, written and duplicated in the counts dict. If jsonl_file is
+    set, the entries are also written there in JSON Lines format.
+    '''
+    seen = set()
+    counts.update(total=0, written=0, duplicated=0)
+    for entry in census:
+        counts['total'] += 1
+        # the compact json of the entry is both the deduplication key and
+        # the JSON Lines line
+        line = serialize_flat(entry, compact=True)
+        if line in seen:
+            counts['duplicated'] += 1
+            continue
+        seen.add(line)
+        counts['written'] += 1
+        if jsonl_file is not None:
+            jsonl_file.write(line + "\n")
+        yield entry
+
+def write_census(path, census, jsonl_path=None):
+    '''
+    Writes the census entries to path as a json list, one entry at a time, so
+    that census can be a generator like the one returned by iter_census().
+    Duplicated entries are only written once. If jsonl_path is set, the
+    entries are also written there in JSON Lines format.
+
+    Returns a dict with the number of entries read, written and duplicated.
+    '''
+    counts = dict()
+    with open(path, mode='w', encoding="utf-8", errors='strict') as f:
+        if jsonl_path is None:
+            serialize_list_to_file(unique_census(census, counts), f,
+                serializer=serialize_flat)
+        else:
+            with open(jsonl_path, mode='w', encoding="utf-8", errors='strict') as jsonl_file:
+                serialize_list_to_file(unique_census(census, counts, jsonl_file), f,
+                    serializer=serialize_flat)
+    return counts
+
+FORM_ELECTION_FUNCS = {
+    "Título": lambda d: ["title", d],
+    "Descripción": lambda d: ["description", d],
+    "Comienzo": lambda d: ["start_date", parse_date_time(d, month_first=True, require_seconds=True).isoformat()+ ".001"],
+    "Final": lambda d: ["end_date", parse_date_time(d, month_first=True, require_seconds=True).isoformat()+ ".001"],
+}
+FORM_CENSUS_KEY = "Censo"
+FORM_MORE_KEYS = {
+    "¿Más preguntas?": lambda v: "No" not in v
+}
+FORM_QUESTION_OPTIONS_KEY = "Opciones"
+FORM_QUESTION_FUNCS = {
+    "Título": lambda d: ["title", d],
+    "Descripción": lambda d: ["description", d],
+    "Número de ganadores": lambda d: ["num_winners", int(d)],
+    "Número máximo de opciones": lambda d: ["max", int(d)],
+    "Número mínimo de opciones": lambda d: ["min", int(d)],
+    "Orden aleatorio": lambda d: ["randomize_answer_order", d == "Aleatorio"],
+    "Resultados":  lambda d: ["answer_total_votes_percentage", "over-total-votes" if d == "Sobre votos totales" else "over-total-valid-votes"]
+}
+
+FORM_ELECTION_FIELD = 0
+FORM_CENSUS = 1
+FORM_QUESTION_FIELD = 2
+FORM_OPTIONS = 3
+FORM_NEXT_QUESTION = 4
+
+def compile_form_plan(keys):
+    '''
+    Compiles the header of a google forms csv into the list of actions to
+    apply to the columns of each row, as tuples (index, action, func). The
+    columns before the census are election fields, and the ones after it are
+    fields of the current question, its options or the marker that closes
+    it. Columns without action are not included.
+    '''
+    plan = []
+    census_found = False
+    for index, key in enumerate(keys):
+        if not census_found and key not in FORM_MORE_KEYS and key in FORM_ELECTION_FUNCS:
+            plan.append((index, FORM_ELECTION_FIELD, FORM_ELECTION_FUNCS[key]))
+        elif key == FORM_CENSUS_KEY:
+            plan.append((index, FORM_CENSUS, None))
+            census_found = True
+        elif census_found and key in FORM_QUESTION_FUNCS:
+            plan.append((index, FORM_QUESTION_FIELD, FORM_QUESTION_FUNCS[key]))
+        elif census_found and key == FORM_QUESTION_OPTIONS_KEY:
+            plan.append((index, FORM_OPTIONS, None))
+        elif census_found and key in FORM_MORE_KEYS:
+            plan.append((index, FORM_NEXT_QUESTION, FORM_MORE_KEYS[key]))
+    return plan
+
+@contextmanager
+def csv_field_size_limit(limit):
+    '''
+    Sets the csv field size limit inside the context. The limit is global to
+    the csv module, so the previous one is restored when leaving it.
+    '''
+    previous_limit = csv.field_size_limit(limit)
+    try:
+        yield
+    finally:
+        csv.field_size_limit(previous_limit)
+
 def form_to_elections(path, separator, config, add_to_id):
     '''
-    Converts the google forms into election configurations
+    Converts the google forms into election configurations, yielding each
+    election as soon as its row is read. The census of each election is a
+    generator of entries over the census cell of the row, see iter_census(),
+    so it should be written before reading the next election to only keep
+    one census cell in memory.
     '''
-    election_funcs = {
-        "Título": lambda d: ["title", d],
-        "Descripción": lambda d: ["description", d],
-        "Comienzo": lambda d: ["start_date", datetime.strptime(d, "%m/%d/%Y %H:%M:%S").isoformat()+ ".001"],
-        "Final": lambda d: ["end_date", datetime.strptime(d, "%m/%d/%Y %H:%M:%S").isoformat()+ ".001"],
-    }
-    census_key = "Censo"
-    more_keys = {
-        "¿Más preguntas?": lambda v: "No" not in v
-    }
     auth_method = config['iam']['event_config']['auth_method']
-    question_options_key = "Opciones"
-    question_funcs = {
-        "Título": lambda d: ["title", d],
-        "Descripción": lambda d: ["description", d],
-        "Número de ganadores": lambda d: ["num_winners", int(d)],
-        "Número máximo de opciones": lambda d: ["max", int(d)],
-        "Número mínimo de opciones": lambda d: ["min", int(d)],
-        "Orden aleatorio": lambda d: ["randomize_answer_order", d == "Aleatorio"],
-        "Resultados":  lambda d: ["answer_total_votes_percentage", "over-total-votes" if d == "Sobre votos totales" else "over-total-valid-votes"]
-    }
 
-    elections = []
-    base_election = copy.deepcopy(BASE_ELECTION)
-    base_election['director'] = config['director']
-    base_election['authorities'] = config['authorities']
-    with open(path, mode='r', encoding="utf-8", errors='strict') as f:
+    num_elections = 0
+    # census cells can be much larger than the default csv field size limit
+    with csv_field_size_limit(2**31 - 1), open_csv_file(path) as f:
         fcsv = csv.reader(f, delimiter=',', quotechar='"')
-        keys = fcsv.__next__()
+        plan = compile_form_plan(fcsv.__next__())
         for values in fcsv:
             if len(values) == 0:
                 continue
 
-            question_num = -1
-            election = copy.deepcopy(base_election)
-            election['id'] = add_to_id + len(elections)
+            election = new_election()
+            election['director'] = config['director']
+            election['authorities'] = config['authorities']
+            election['id'] = add_to_id + num_elections
             question = None
 
-            for key, value, index in zip(keys, values, range(len(values))):
-                if question_num == -1 and key not in more_keys.keys() and key in election_funcs.keys():
-                    dest_key, dest_value =  election_funcs[key](value)
-                    election[dest_key] = dest_value
-                elif key == census_key:
-                    if auth_method == "sms":
-                        election['census'] = [{"tlf": item} for item in value.split("\n")]
-                    else: # email
-                        election['census'] = [{"email": item} for item in value.split("\n")]
-                    question_num += 1
-                    question = copy.deepcopy(BASE_QUESTION)
-                elif question_num >= 0 and key in question_funcs.keys():
-                    dest_key, dest_value =  question_funcs[key](value)
+            for index, action, func in plan:
+                if index >= len(values):
+                    break
+                value = values[index]
+                if action == FORM_QUESTION_FIELD:
+                    dest_key, dest_value =  func(value)
                     question[dest_key] = dest_value
-                elif question_num >= 0 and key == question_options_key:
+                elif action == FORM_ELECTION_FIELD:
+                    dest_key, dest_value =  func(value)
+                    election[dest_key] = dest_value
+                elif action == FORM_CENSUS:
+                    election['census'] = iter_census(value, auth_method)
+                    question = new_question()
+                elif action == FORM_OPTIONS:
                     options = value.strip().split("\n")
                     question['answers'] = [{
                         "id": opt_id,
@@ -330,20 +696,374 @@ def form_to_elections(path, separator, config, add_to_id):
                         "text": opt
                     }
                     for opt, opt_id in zip(options, range(len(options)))]
-                elif question_num >= 0 and key in more_keys.keys():
-                    question_num += 1
+                else: # FORM_NEXT_QUESTION
                     election['questions'].append(question)
-                    question = copy.deepcopy(BASE_QUESTION)
+                    question = new_question()
 
-                    if not more_keys[key](value):
-                        elections.append(election)
+                    if not func(value):
+                        num_elections += 1
+                        yield election
                         break
-    return elections
+
+IMPORT_VERSION = 2
+# maps each input file name of an output directory to its
+# import_manifest_entry(), with the warnings report if it had warnings
+IMPORT_MANIFEST = ".import-manifest.json"
+
+def import_manifest_entry(i, file_path, config_sha256, args, entry=None):
+    '''
+    Returns the import manifest entry for the current contents of a file: its
+    size, mtime and sha256 (see file_manifest_entry()), the hash of the
+    config and the import options. The output files written are added once
+    it's imported.
+    '''
+    entry = file_manifest_entry(file_path, entry)
+    entry.update(
+        config_sha256=config_sha256,
+        format=args.format,
+        admin_format=args.admin_format,
+        index=i,
+        add_to_id=args.add_to_id,
+        strict=args.strict,
+        warnings_mode=args.warnings,
+        version=IMPORT_VERSION,
+        outputs=[]
+    )
+    return entry
+
+def import_unchanged(entry, old_entry, output_dir):
+    '''
+    Returns True if the election of a file doesn't need to be imported again,
+    because neither the file, the config nor the import options changed
+    since it was imported and all its output files still exist. The index of
+    the file only matters in admin format, where it names the output files.
+    '''
+    keys = [
+        'sha256', 'config_sha256', 'format', 'admin_format', 'add_to_id',
+        'strict', 'warnings_mode', 'version'
+    ]
+    if entry['admin_format']:
+        keys.append('index')
+    return old_entry is not None and\
+        all(entry[key] == old_entry.get(key) for key in keys) and\
+        len(old_entry.get('outputs', [])) > 0 and\
+        all(
+            os.path.isfile(os.path.join(output_dir, output))
+            for output in old_entry['outputs'])
+
+def remove_stale_outputs(output_dir, old_manifest, manifest):
+    '''
+    Removes the output files of the previous import that are not outputs of
+    the current one, like the ones of removed input files or of elections
+    whose id changed. Returns the sorted names of the removed files.
+    '''
+    outputs = set(
+        output
+        for entry in manifest.values()
+        for output in entry['outputs'])
+    stale = set(
+        output
+        for entry in old_manifest.values()
+        for output in entry.get('outputs', [])
+        if output not in outputs and os.path.basename(output) == output)
+    removed = []
+    for output in sorted(stale):
+        path = os.path.join(output_dir, output)
+        if os.path.isfile(path):
+            os.unlink(path)
+            removed.append(output)
+    return removed
+
+BLOCKS_SEPARATORS = {
+  "csv-blocks": ",",
+  "tsv-blocks": "\t"
+}
+
+BLOCKS_EXTENSIONS = {
+  "csv-blocks": ".csv",
+  "tsv-blocks": ".tsv"
+}
+
+def list_election_files(args):
+    '''
+    Returns the sorted names of the election files of the input directory
+    '''
+    extension = BLOCKS_EXTENSIONS[args.format]
+    return sorted([name for name in os.listdir(args.input_path)
+        if os.path.isfile(os.path.join(args.input_path, name)) and strip_compressed_extension(name).endswith(extension)])
+
+def import_jobs(args):
+    '''
+    Returns the number of elections to import in parallel
+    '''
+    return args.jobs if args.jobs > 0 else os.cpu_count()
+
+@contextmanager
+def import_executor(args):
+    '''
+    Returns a context with the process pool to import args.jobs elections in
+    parallel, or None to import them in this process when there's a single
+    job. The pool is shut down when leaving the context.
+    '''
+    jobs = import_jobs(args)
+    if jobs <= 1:
+        yield None
+        return
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        yield executor
+    finally:
+        executor.shutdown()
+
+def iter_imports(executor, indexes, names, args, config, extra_options):
+    '''
+    Imports the election files names with import_election_file(), yielding
+    their results in order. They are imported in the worker processes of
+    executor, or in this process if it's None, printing their output right
+    away. When the iteration stops before the end, for example because of an
+    error, the imports still pending are cancelled.
+
+    At most twice as many imports as jobs are submitted at once, and each
+    result is dropped once yielded, so that only the results of the imports
+    in flight are kept in memory.
+    '''
+    if executor is None:
+        for i, name in zip(indexes, names):
+            yield import_election_file(
+                i, name, args, config, extra_options, capture=False)
+        return
+
+    window = 2 * import_jobs(args)
+    futures = deque()
+    try:
+        for i, name in zip(indexes, names):
+            futures.append(executor.submit(
+                import_election_file, i, name, args, config, extra_options))
+            if len(futures) >= window:
+                yield futures.popleft().result()
+        while len(futures) > 0:
+            yield futures.popleft().result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def import_election_file(i, name, args, config, extra_options=None,
+    capture=True):
+    '''
+    Imports the election in the file name of the input directory, writing its
+    json files to the output directory. i is the index of the file in the
+    sorted list of files, used for the file names in admin format. When
+    writing to a bundle, the files are returned instead, to be added to the
+    bundle in order. extra_options are the compiled extra options of config,
+    see blocks_to_election().
+
+    When executed in a worker process the output is captured and returned
+    instead of being printed, so that it can be printed in order, and with
+    capture unset it's printed right away.
+    Returns a tuple (output, error traceback or None, warnings report, files)
+    where files is a list of (file name, data), with data set to None if the
+    file was written to the output directory.
+    '''
+    separator = BLOCKS_SEPARATORS[args.format]
+    extension = BLOCKS_EXTENSIONS[args.format]
+    output = StringIO()
+    diagnostics = get_diagnostics(args.warnings)
+    # in json mode the validation warnings are reported instead of printed
+    issues = [] if args.warnings == "json" else None
+    files = []
+    try:
+        with redirect_stdout(output) if capture else nullcontext():
+            print("importing %s" % name)
+            file_path = os.path.join(args.input_path, name)
+            blocks = iter_csv_blocks(
+                path=file_path, separator=separator, compact_rows=True,
+                diagnostics=diagnostics)
+            election = blocks_to_election(
+                blocks, config, args.add_to_id, extra_options=extra_options,
+                strict=args.strict, issues=issues)
+            if args.warnings == "summary":
+                diagnostics.print_summary()
+
+            if str(election['id']) + extension != strip_compressed_extension(name):
+                print("WARNING: election id %i doesn't match filename %s" % (election['id'], name))
+
+            if not args.admin_format:
+                files.append((str(election['id']) + ".config.json", election))
+            else:
+                files.append((str(i) + ".config.json", config['iam']['event_config']))
+                files.append((str(i) + ".census.json", config['iam'].get('census_data', [])))
+                files.append((str(i) + ".json", election))
+
+            if config.get('tally_pipes_config', None) is not None:
+                results_config = dict(
+                    version="1.0",
+                    pipes=config['tally_pipes_config']
+                )
+                if not args.admin_format:
+                    files.append((str(election['id']) + ".config.results.json", results_config))
+                else:
+                    files.append((str(i) + ".config.results.json", results_config))
+
+            if args.bundle is None:
+                for file_name, data in files:
+                    output_path = os.path.join(args.output_path, file_name)
+                    with open(output_path, mode='w', encoding="utf-8", errors='strict') as f:
+                        serialize_to_file(data, f)
+                files = [(file_name, None) for file_name, data in files]
+    except Exception:
+        return output.getvalue(), traceback.format_exc(), import_report(diagnostics, issues), files
+    return output.getvalue(), None, import_report(diagnostics, issues), files
+
+def import_directory(args, config, config_sha256, warnings_report,
+    force=False, names=None, executor=None):
+    '''
+    Imports the elections of the files in the input directory to the output
+    directory, skipping the ones whose file, config and import options
+    didn't change since they were last imported, unless force is set.
+    config_sha256 is the hash of the config file, and the warnings of each
+    file are added to warnings_report in json mode.
+
+    If names is set, only those files are checked for changes, and the rest
+    keep their manifest entry, in admin format as long as they are at the
+    same position of the sorted file list. The elections are imported with executor, see
+    iter_imports().
+    '''
+    if not os.path.exists(args.output_path):
+        os.makedirs(args.output_path)
+    files = list_election_files(args)
+    # admin-format indexes are assigned from the sorted file list
+    # so that they don't depend on the order files are processed
+    indexes = dict((name, i) for i, name in enumerate(files))
+
+    # only import the elections whose file, config or import
+    # options changed since the last import
+    manifest_path = os.path.join(args.output_path, IMPORT_MANIFEST)
+    old_manifest = load_manifest(manifest_path)
+    manifest = dict()
+    pending = []
+    for name in files:
+        old_entry = old_manifest.get(name)
+        if names is not None and name not in names and\
+            old_entry is not None and\
+            (not args.admin_format or old_entry.get('index') == indexes[name]):
+            manifest[name] = old_entry
+            if 'warnings' in old_entry:
+                warnings_report[name] = old_entry['warnings']
+            continue
+
+        entry = import_manifest_entry(
+            indexes[name], os.path.join(args.input_path, name),
+            config_sha256, args, old_entry)
+        if not force and import_unchanged(entry, old_entry, args.output_path):
+            entry['outputs'] = old_entry['outputs']
+            # the warnings of the last import are reported again
+            if 'warnings' in old_entry:
+                entry['warnings'] = old_entry['warnings']
+                warnings_report[name] = old_entry['warnings']
+            manifest[name] = entry
+        else:
+            pending.append((name, entry))
+
+    pending_names = [name for name, entry in pending]
+    pending_indexes = [indexes[name] for name in pending_names]
+    extra_options = compile_extra_options(config)
+    with closing(iter_imports(executor, pending_indexes, pending_names, args, config, extra_options)) as results:
+        for (name, entry), (output, error, report, election_files) in zip(pending, results):
+            print(output, end="")
+            if args.warnings == "json" and has_warnings(report):
+                warnings_report[name] = report
+            if error is not None:
+                # the files not imported keep their previous entry, so
+                # that they are imported and their stale outputs removed
+                # in the next run
+                old_manifest.update(manifest)
+                save_manifest(manifest_path, old_manifest)
+                raise Exception("error importing %s:\n%s" % (name, error))
+            entry['outputs'] = [file_name for file_name, data in election_files]
+            if args.warnings == "json" and has_warnings(report):
+                entry['warnings'] = report
+            manifest[name] = entry
+
+    stale = remove_stale_outputs(args.output_path, old_manifest, manifest)
+    save_manifest(manifest_path, manifest)
+    for output in stale:
+        print("removed stale %s" % output)
+    print("%d elections imported, %d skipped as unchanged" % (
+        len(pending), len(files) - len(pending)))
+
+def load_config(config_path):
+    '''
+    Loads the config, returning a tuple (config, sha256 of the config file)
+    '''
+    with open(config_path, mode='rb') as f:
+        data = f.read()
+    return json.loads(data.decode("utf-8")), hashlib.sha256(data).hexdigest()
+
+def watch_directory(args, config, config_sha256, executor=None):
+    '''
+    Watches the input directory and imports the elections whose files
+    change, until interrupted. The config is kept in memory, and reloaded
+    when its file changes, which checks all the elections again. Errors are
+    printed, and the directory is still watched. The elections are imported
+    with executor, see iter_imports().
+    '''
+    extension = BLOCKS_EXTENSIONS[args.format]
+    watcher = get_watcher(args.input_path, polling=args.watch_polling)
+    config_stat = os.stat(args.config_path)
+    print("watching %s for changes with %s" % (
+        args.input_path, watcher.__class__.__name__))
+    try:
+        while True:
+            # the config is checked at least once per second
+            names = wait_changes(watcher, timeout=1.0, debounce=args.watch_debounce)
+            names = set(
+                name for name in names
+                if strip_compressed_extension(name).endswith(extension))
+
+            # a new config checks all the files again
+            config_changed = False
+            try:
+                stat = os.stat(args.config_path)
+            except OSError:
+                # editors can save the config by renaming a new file over
+                # it, so it may be missing for a moment: check it next time
+                stat = config_stat
+            if (stat.st_size, stat.st_mtime_ns) != (config_stat.st_size, config_stat.st_mtime_ns):
+                config_stat = stat
+                try:
+                    config, config_sha256 = load_config(args.config_path)
+                    print("config %s changed, reloaded" % args.config_path)
+                    names.add(args.config_path)
+                    config_changed = True
+                except Exception:
+                    print("can't reload %s, still using the previous config" % args.config_path)
+                    traceback.print_exc()
+
+            if len(names) == 0:
+                continue
+
+            print("changed: %s" % ", ".join(sorted(names)))
+            try:
+                warnings_report = dict()
+                import_directory(
+                    args, config, config_sha256, warnings_report,
+                    names=None if config_changed else names,
+                    executor=executor)
+                if args.warnings == "json":
+                    with open(args.warnings_path, mode='w', encoding="utf-8", errors='strict') as f:
+                        serialize_to_file(warnings_report, f)
+            except Exception:
+                print("malformed CSV")
+                traceback.print_exc()
+    except KeyboardInterrupt:
+        print("stopped watching %s" % args.input_path)
+    finally:
+        watcher.close()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Converts a CSV into the json to create an election.')
     parser.add_argument('-c', '--config-path', help='default config for the election')
-    parser.add_argument('-i', '--input-path', help='input file or directory')
+    parser.add_argument('-i', '--input-path', help='input file or directory. Files can be compressed with gzip, xz or bzip2, and - reads the standard input')
     parser.add_argument('-o', '--output-path', help='output file or directory')
     parser.add_argument('-A', '--admin-format', help='use create format for sequent-admin instead of ballot-box', action="store_true")
     parser.add_argument('-a', '--add-to-id', type=int, help='add an int number to the id', default=0)
@@ -352,94 +1072,156 @@ if __name__ == '__main__':
         choices=['csv-blocks', 'tsv-blocks', 'csv-google-forms'],
         default="csv-blocks",
         help='output file or directory')
+    parser.add_argument(
+        '-w', '--warnings',
+        choices=WARNINGS_MODES,
+        default="full",
+        help='print all the csv warnings, a summary per block and key, or save them in json to --warnings-path')
+    parser.add_argument('--warnings-path', help='path of the json warnings report', default='warnings.json')
+    parser.add_argument('-b', '--bundle', choices=BUNDLE_FORMATS,
+        help='when importing a directory or google forms, write all the files to a single bundle in --output-path instead of to a directory: JSON Lines, or a deterministic tar, gzipped if the path ends with .gz or .tgz')
+    parser.add_argument('--census-jsonl', action="store_true",
+        help='with csv-google-forms, also write each census as JSON Lines to <id>.census.jsonl')
+    parser.add_argument('-F', '--force', action="store_true",
+        help='in directory mode, import all the elections even if neither their file nor the config changed since the last import')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='number of elections to import in parallel in directory mode, 0 to use all the cpus')
+    parser.add_argument('--strict', action="store_true",
+        help='treat invalid minimum, maximum and number of winners of a question, and duplicated option ids, as errors instead of warnings')
+    parser.add_argument('--watch', action="store_true",
+        help='after importing a directory, keep watching it and import the elections whose files change')
+    parser.add_argument('--watch-debounce', type=float, default=0.2,
+        help='seconds without changes to wait before importing the changed files in --watch mode')
+    parser.add_argument('--watch-polling', action="store_true",
+        help='in --watch mode, check the files periodically instead of using inotify')
 
 
     args = parser.parse_args()
 
-    if not os.access(args.input_path, os.R_OK):
+    if args.input_path != "-" and not os.access(args.input_path, os.R_OK):
       print("can't read %s" % args.input_path)
       exit(2)
     if os.path.isdir(args.output_path) and not os.access(args.output_path, os.W_OK):
       print("can't write to %s" % args.output_path)
       exit(2)
+    if args.bundle is not None and os.path.isdir(args.output_path):
+      print("the bundle output path %s is a directory" % args.output_path)
+      exit(2)
+    if args.bundle is not None and args.format != "csv-google-forms" and not os.path.isdir(args.input_path):
+      print("--bundle can only be used when importing a directory or google forms")
+      exit(2)
+    if args.bundle is not None and args.census_jsonl:
+      print("--census-jsonl can't be used with --bundle")
+      exit(2)
     if not os.access(args.config_path, os.R_OK):
       print("can't read %s" % args.config_path)
       exit(2)
+    if args.watch and (args.format == "csv-google-forms" or args.bundle is not None or not os.path.isdir(args.input_path)):
+      print("--watch can only be used when importing a directory of csv-blocks or tsv-blocks to a directory")
+      exit(2)
 
-    config = None
-    with open(args.config_path, mode='r', encoding="utf-8", errors='strict') as f:
-        config = json.loads(f.read())
+    config, config_sha256 = load_config(args.config_path)
 
     try:
         if args.format == "csv-blocks" or args.format == "tsv-blocks":
-            separator = {
-              "csv-blocks": ",",
-              "tsv-blocks": "\t"
-            }[args.format]
-            extension = {
-              "csv-blocks": ".csv",
-              "tsv-blocks": ".tsv"
-            }[args.format]
-
-            if os.path.isdir(args.input_path):
-                if not os.path.exists(args.output_path):
-                    os.makedirs(args.output_path)
-                i = 0
-                files = sorted([name for name in os.listdir(args.input_path)
-                            if os.path.isfile(os.path.join(args.input_path, name)) and name.endswith(extension)])
-                for name in files:
-                    print("importing %s" % name)
-                    file_path = os.path.join(args.input_path, name)
-                    blocks = csv_to_blocks(path=file_path, separator=separator)
-                    election = blocks_to_election(blocks, config, args.add_to_id)
-                    
-                    if str(election['id']) + extension != name:
-                        print("WARNING: election id %i doesn't match filename %s" % (election['id'], name))
-
-                    if not args.admin_format:
-                        output_path = os.path.join(args.output_path, str(election['id']) + ".config.json")
-                    else:
-                        output_path = os.path.join(args.output_path, str(i) + ".json")
-                        auth_config_path = os.path.join(args.output_path, str(i) + ".config.json")
-                        auth_config = config['iam']['event_config']
-                        with open(auth_config_path, mode='w', encoding="utf-8", errors='strict') as f:
-                            f.write(serialize(auth_config))
-
-                        auth_census_path = os.path.join(args.output_path, str(i) + ".census.json")
-                        census_config = config['iam'].get('census_data', [])
-                        with open(auth_census_path, mode='w', encoding="utf-8", errors='strict') as f:
-                            f.write(serialize(census_config))
+            separator = BLOCKS_SEPARATORS[args.format]
+            extension = BLOCKS_EXTENSIONS[args.format]
+            warnings_report = dict()
 
+            if os.path.isdir(args.input_path) and args.bundle is not None:
+                files = list_election_files(args)
 
-                    with open(output_path, mode='w', encoding="utf-8", errors='strict') as f:
-                        f.write(serialize(election))
-
-                    if config.get('tally_pipes_config', None) is not None:
-                        if not args.admin_format:
-                            results_conf_path = os.path.join(args.output_path, str(election['id']) + ".config.results.json")
-                        else:
-                            results_conf_path = os.path.join(args.output_path, str(i) + ".config.results.json")
-                        with open(
-                                results_conf_path,
-                                mode='w',
-                                encoding="utf-8",
-                                errors='strict') as f:
-                            f.write(serialize(
-                                dict(
-                                    version="1.0",
-                                    pipes=config['tally_pipes_config']
-                                )
-                            ))
-                    i += 1
+                # the files of each election are added to the bundle in the
+                # order of the sorted file list
+                extra_options = compile_extra_options(config)
+                with import_executor(args) as executor,\
+                        open_bundle(args.output_path, args.bundle) as bundle,\
+                        closing(iter_imports(executor, range(len(files)), files, args, config, extra_options)) as results:
+                    for name, (output, error, report, election_files) in zip(files, results):
+                        print(output, end="")
+                        if args.warnings == "json" and has_warnings(report):
+                            warnings_report[name] = report
+                        if error is not None:
+                            raise Exception("error importing %s:\n%s" % (name, error))
+                        for file_name, data in election_files:
+                            bundle.add(file_name, data)
+
+                print("%d elections imported to bundle %s" % (
+                    len(files), args.output_path))
+            elif os.path.isdir(args.input_path) and args.watch:
+                # the same workers import the elections while watching
+                with import_executor(args) as executor:
+                    try:
+                        import_directory(
+                            args, config, config_sha256, warnings_report,
+                            force=args.force, executor=executor)
+                        if args.warnings == "json":
+                            with open(args.warnings_path, mode='w', encoding="utf-8", errors='strict') as f:
+                                serialize_to_file(warnings_report, f)
+                    except Exception:
+                        print("malformed CSV")
+                        traceback.print_exc()
+                    watch_directory(args, config, config_sha256, executor)
+            elif os.path.isdir(args.input_path):
+                with import_executor(args) as executor:
+                    import_directory(
+                        args, config, config_sha256, warnings_report,
+                        force=args.force, executor=executor)
             else:
-                blocks = csv_to_blocks(path=args.input_path, separator=separator)
-                election = blocks_to_election(blocks, config, args.add_to_id)
+                diagnostics = get_diagnostics(args.warnings)
+                issues = [] if args.warnings == "json" else None
+                blocks = iter_csv_blocks(
+                    path=args.input_path, separator=separator, compact_rows=True,
+                    diagnostics=diagnostics)
+                try:
+                    election = blocks_to_election(
+                        blocks, config, args.add_to_id, strict=args.strict,
+                        issues=issues)
+                except ElectionValidationError:
+                    # the issues that made the import fail are reported too
+                    if args.warnings == "json":
+                        warnings_report[os.path.basename(args.input_path)] = import_report(diagnostics, issues)
+                        with open(args.warnings_path, mode='w', encoding="utf-8", errors='strict') as f:
+                            serialize_to_file(warnings_report, f)
+                    raise
+                report = import_report(diagnostics, issues)
+                if args.warnings == "json" and has_warnings(report):
+                    warnings_report[os.path.basename(args.input_path)] = report
+                if args.warnings == "summary":
+                    diagnostics.print_summary()
 
-                if str(election['id']) + extension != os.path.basename(args.input_path):
+                input_name = strip_compressed_extension(os.path.basename(args.input_path))
+                if args.input_path != "-" and str(election['id']) + extension != input_name:
                     print("WARNING: election id %i doesn't match filename %s" % (election['id'], os.path.basename(args.input_path)))
 
                 with open(args.output_path, mode='w', encoding="utf-8", errors='strict') as f:
-                    f.write(serialize(election))
+                    serialize_to_file(election, f)
+
+            if args.warnings == "json":
+                with open(args.warnings_path, mode='w', encoding="utf-8", errors='strict') as f:
+                    serialize_to_file(warnings_report, f)
+        elif args.bundle is not None:
+            elections = form_to_elections(path=args.input_path,
+                                          separator="\t",
+                                          config=config,
+                                          add_to_id=args.add_to_id)
+            num_elections = 0
+            with open_bundle(args.output_path, args.bundle) as bundle:
+                for election in elections:
+                    num_elections += 1
+                    counts = dict()
+                    bundle.add_list(
+                        "%d.census.json" % election["id"],
+                        unique_census(election['census'], counts),
+                        serializer=serialize_flat)
+                    print("election %d census: %d voters, %d duplicates removed" % (
+                        election["id"], counts['written'], counts['duplicated']))
+                    del election['census']
+
+                    bundle.add("%d.json" % election["id"], election)
+                    bundle.add("%d.config.json" % election["id"], config['iam']['event_config'])
+            print("%d elections imported to bundle %s" % (
+                num_elections, args.output_path))
         else:
             if not os.path.exists(args.output_path):
                 os.makedirs(args.output_path)
@@ -453,19 +1235,22 @@ if __name__ == '__main__':
                                           add_to_id=args.add_to_id)
             for election in elections:
                 fpath = os.path.join(args.output_path, "%d.census.json" % election["id"])
-                with open(fpath, mode='w', encoding="utf-8", errors='strict') as f:
-                    f.write(serialize(election['census']))
+                jsonl_path = None
+                if args.census_jsonl:
+                    jsonl_path = os.path.join(args.output_path, "%d.census.jsonl" % election["id"])
+                counts = write_census(fpath, election['census'], jsonl_path)
+                print("election %d census: %d voters, %d duplicates removed" % (
+                    election["id"], counts['written'], counts['duplicated']))
                 del election['census']
 
                 fpath = os.path.join(args.output_path, "%d.json" % election["id"])
                 with open(fpath, mode='w', encoding="utf-8", errors='strict') as f:
-                    f.write(serialize(election))
+                    serialize_to_file(election, f)
 
                 fpath = os.path.join(args.output_path, "%d.config.json" % election["id"])
                 with open(fpath, mode='w', encoding="utf-8", errors='strict') as f:
-                    f.write(serialize(config['iam']['event_config']))
+                    serialize_to_file(config['iam']['event_config'], f)
     except:
         print("malformed CSV")
-        import traceback
         traceback.print_exc()
         exit(3)
@@ -17,6 +17,7 @@
 
 import argparse
 import os
+import re
 import json
 import copy
 import requests
@@ -24,6 +25,8 @@ from datetime import datetime
 from importlib import import_module
 from requests.auth import HTTPBasicAuth
 
+from utils.bundle import iter_bundle, bundle_format
+
 ADMIN_CONFIG = None
 KHMAC = None
 PLUGINS = []
@@ -167,6 +170,97 @@ def createElection(config, aeid):
     electionCommand(aeid, "create")
 
 
+def createFromFiles(json_ae, json_census, json_config):
+    '''
+    Creates an auth-event with its census and the election in ballot-box
+    from the json files written by import_election_csv.py in admin format
+    '''
+    # modify email title
+    json_config['auth_method'] = ADMIN_CONFIG['iam']['event_config']['auth_method']
+    json_config['auth_method_config'] = copy.deepcopy(ADMIN_CONFIG['iam']['event_config']['auth_method_config'])
+    if "subject" in json_config['auth_method_config']:
+        json_config['auth_method_config']['subject'] = json_config['auth_method_config']['subject'] % dict(
+            title=json_ae['title'])
+
+    getperm(obj_type="AuthEvent", perm="create")
+
+    aeid = createAuthevent(json_config)
+    print("Created auth-event with id ", aeid)
+    if len(json_census) > 0:
+        msg = addCensus(aeid, json_census)
+        print("Added census.")
+    getperm(obj_type="AuthEvent", perm="edit", obj_id=aeid)
+    json_ae['id'] = aeid
+    createElection(json_ae, aeid)
+
+def iterCreateDir(path):
+    '''
+    Iterates the elections of a directory written by import_election_csv.py
+    in admin format, as tuples (election, census, config)
+    '''
+    fids = [fname.replace(".census.json", "")
+        for fname in os.listdir(path)
+        if fname.endswith(".census.json")]
+
+    for fid in fids:
+        ae = fid + ".json"
+        census = fid + ".census.json"
+        config = fid + ".config.json"
+
+        json_ae = loadJson(os.path.join(path, ae))
+        json_census = loadJson(os.path.join(path, census))
+        json_config = loadJson(os.path.join(path, config))
+        yield json_ae, json_census, json_config
+
+# the files of each election in an admin format bundle, by their extension
+ADMIN_BUNDLE_FILE_RE = re.compile(
+    r"^([0-9]+)\.(json|census\.json|config\.json|config\.results\.json)$")
+ADMIN_BUNDLE_KINDS = {
+    "json": "ae",
+    "census.json": "census",
+    "config.json": "config",
+}
+
+def iterCreateBundle(path):
+    '''
+    Iterates the elections of a bundle written by import_election_csv.py
+    --bundle in admin format, as tuples (election, census, config). Each
+    election is returned as soon as its three files have been read, so only
+    the files of the election being read are kept in memory.
+
+    The files of each election are written one after the other, so a file
+    of another election before the current one is complete, or any file not
+    named like the admin format ones, means it's not an admin format bundle
+    and raises an exception.
+    '''
+    fid = None
+    files = dict()
+    for name, data in iter_bundle(path):
+        match = ADMIN_BUNDLE_FILE_RE.match(name)
+        if match is None:
+            raise Exception(
+                "%s is not an admin format bundle, unexpected file %s" % (
+                    path, name))
+        name_fid, extension = match.groups()
+        if extension not in ADMIN_BUNDLE_KINDS:
+            continue
+
+        if name_fid != fid:
+            if len(files) > 0:
+                raise Exception(
+                    "%s is not an admin format bundle, election %s is "
+                    "incomplete" % (path, fid))
+            fid = name_fid
+        files[ADMIN_BUNDLE_KINDS[extension]] = data
+        if len(files) == 3:
+            yield files["ae"], files["census"], files["config"]
+            files = dict()
+
+    if len(files) > 0:
+        raise Exception(
+            "%s is not an admin format bundle, election %s is incomplete" % (
+                path, fid))
+
 def electionCommand(aeid, command, method="POST", data=None):
     global KHMAC
     base_url = ADMIN_CONFIG['ballot_box_base_url']
@@ -191,7 +285,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument("-c", "--create",
-            help="path to the dir containing json configuration.")
+            help="path to the dir containing json configuration, or to a bundle written by import_election_csv.py --bundle.")
     parser.add_argument("-C", "--config", required=True,
             help="path to the sequent-admin configuration file.")
     parser.add_argument("--start", type=check_positive_id,
@@ -227,41 +321,17 @@ if __name__ == "__main__":
     ADMIN_CONFIG = loadJson(args.config)
 
     if args.create:
-        if not os.path.isdir(args.create):
-            print("--create must bea a directory")
+        if os.path.isdir(args.create):
+            elections = iterCreateDir(args.create)
+        elif os.path.isfile(args.create) and bundle_format(args.create) is not None:
+            elections = iterCreateBundle(args.create)
+        else:
+            print("--create must bea a directory or a bundle")
             exit(1)
 
-        fids = [fname.replace(".census.json", "")
-            for fname in os.listdir(args.create)
-            if fname.endswith(".census.json")]
-
         headers = login()
-        for fid in fids:
-            ae = fid + ".json"
-            census = fid + ".census.json"
-            config = fid + ".config.json"
-
-            json_ae = loadJson(os.path.join(args.create, ae))
-            json_census = loadJson(os.path.join(args.create, census))
-            json_config = loadJson(os.path.join(args.create, config))
-
-            # modify email title
-            json_config['auth_method'] = ADMIN_CONFIG['iam']['event_config']['auth_method']
-            json_config['auth_method_config'] = copy.deepcopy(ADMIN_CONFIG['iam']['event_config']['auth_method_config'])
-            if "subject" in json_config['auth_method_config']:
-                json_config['auth_method_config']['subject'] = json_config['auth_method_config']['subject'] % dict(
-                    title=json_ae['title'])
-
-            getperm(obj_type="AuthEvent", perm="create")
-
-            aeid = createAuthevent(json_config)
-            print("Created auth-event with id ", aeid)
-            if len(json_census) > 0:
-                msg = addCensus(aeid, json_census)
-                print("Added census.")
-            getperm(obj_type="AuthEvent", perm="edit", obj_id=aeid)
-            json_ae['id'] = aeid
-            createElection(json_ae, aeid)
+        for json_ae, json_census, json_config in elections:
+            createFromFiles(json_ae, json_census, json_config)
     elif args.start:
         headers = login()
         getperm(obj_type="AuthEvent", perm="edit", obj_id=args.start)
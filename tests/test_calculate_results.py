@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+
+import pytest
+
+from config_updates import calculate_results, create_pdf, RESULTS_FORMATS
+from utils.results_cache import ResultsCache
+
+# records the command line it was executed with and prints fake results. The
+# pdf is written to the elections path, like tally-pipes does with -eid
+FAKE_TALLY_PIPES = """#!/bin/sh
+echo "$0 $*" >> %(calls_path)s
+case "$*" in *-eid*) eid=$(echo "$*" | sed 's/.*-eid //'); echo pdf > %(elections_path)s/$eid.results.pdf;; esac
+echo "results $*"
+"""
+
+@pytest.fixture
+def election_tree(tmp_path):
+    '''
+    Two elections, 1 and 2 (consolidated with 1), with their tallies and
+    results config
+    '''
+    elections_path = str(tmp_path / "elections")
+    private_path = str(tmp_path / "private")
+    calls_path = str(tmp_path / "calls.txt")
+    bin_path = str(tmp_path / "tally-pipes")
+    tree_path = str(tmp_path / "tree.txt")
+    os.makedirs(elections_path)
+    for election_id in [1, 2]:
+        os.makedirs(os.path.join(private_path, str(election_id)))
+        for name in ["tally.tar.gz", "ids"]:
+            with open(os.path.join(private_path, str(election_id), name), mode='w') as f:
+                f.write("tally %d" % election_id)
+        with open(os.path.join(elections_path, "%d.config.results.json" % election_id), mode='w') as f:
+            f.write('{"version": "1.0", "pipes": []}')
+    with open(tree_path, mode='w') as f:
+        f.write("1\n1,2\n")
+    with open(bin_path, mode='w') as f:
+        f.write(FAKE_TALLY_PIPES % dict(
+            calls_path=calls_path, elections_path=elections_path))
+    os.chmod(bin_path, os.stat(bin_path).st_mode | stat.S_IXUSR)
+    config = dict(
+        ballot_box_private_datastore_path=private_path,
+        tally_pipes_bin_path=bin_path)
+    return dict(
+        config=config, tree_path=tree_path, elections_path=elections_path,
+        calls_path=calls_path)
+
+def read_lines(path):
+    with open(path, mode='r', encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f]
+
+def test_check_prints_the_executed_commands(election_tree, capfd):
+    calculate_results(
+        election_tree['config'], election_tree['tree_path'],
+        election_tree['elections_path'], check=True)
+    printed = [
+        line.split("calculating results.. json ", 1)[1]
+        for line in capfd.readouterr().out.splitlines()
+        if "calculating results.. json " in line]
+    executed = read_lines(election_tree['calls_path'])
+    assert len(executed) == 2
+    assert printed == executed
+    assert all(" -s " not in cmd for cmd in executed)
+    # nothing is written in check mode
+    assert sorted(os.listdir(election_tree['elections_path'])) == [
+        "1.config.results.json", "2.config.results.json"]
+
+@pytest.mark.parametrize("jobs,concurrent_formats", [(1, False), (2, True)])
+def test_calculate_logs_the_executed_commands(election_tree, jobs,
+    concurrent_formats, capfd):
+    calculate_results(
+        election_tree['config'], election_tree['tree_path'],
+        election_tree['elections_path'], check=False, jobs=jobs,
+        concurrent_formats=concurrent_formats)
+    executed = read_lines(election_tree['calls_path'])
+    assert len(executed) == 2 * len(RESULTS_FORMATS)
+    for election_id in [1, 2]:
+        for oformat in RESULTS_FORMATS:
+            path = os.path.join(
+                election_tree['elections_path'],
+                "%d.results.%s" % (election_id, oformat))
+            assert os.path.isfile(path)
+    if jobs > 1:
+        logged = []
+        for election_id in [1, 2]:
+            log_path = os.path.join(
+                election_tree['elections_path'], "%d.results.log" % election_id)
+            logged += [
+                line for line in read_lines(log_path)
+                if line.startswith(election_tree['config']['tally_pipes_bin_path'])]
+        assert sorted(logged) == sorted(executed)
+
+def test_results_cache(election_tree, tmp_path, capfd):
+    cache_path = str(tmp_path / "cache")
+
+    def calculate():
+        calculate_results(
+            election_tree['config'], election_tree['tree_path'],
+            election_tree['elections_path'], check=False,
+            results_cache=ResultsCache(cache_path, link=True))
+        return len(read_lines(election_tree['calls_path']))
+
+    def cached_pdfs():
+        pdfs = []
+        for dir_path, _, names in os.walk(cache_path):
+            if "results.pdf" in names:
+                with open(os.path.join(dir_path, "results.pdf"), mode='r') as f:
+                    pdfs.append(f.read())
+        return sorted(pdfs)
+
+    assert calculate() == 2 * len(RESULTS_FORMATS)
+    assert "results cache: 0 hits, 2 misses" in capfd.readouterr().out
+    assert calculate() == 2 * len(RESULTS_FORMATS)
+    assert "results cache: 2 hits, 0 misses" in capfd.readouterr().out
+
+    # the pdf is written again without modifying its linked cached copy
+    pdf_path = os.path.join(election_tree['elections_path'], "2.results.pdf")
+    assert os.stat(pdf_path).st_nlink == 2
+    pdfs = cached_pdfs()
+    create_pdf(2, ".config.results.json", election_tree['elections_path'],
+        election_tree['config']['tally_pipes_bin_path'], "pdf", [])
+    assert os.stat(pdf_path).st_nlink == 1
+    assert cached_pdfs() == pdfs
+
+    # a new tally of the first election changes the results of both
+    tally_path = os.path.join(
+        election_tree['config']['ballot_box_private_datastore_path'], "1",
+        "tally.tar.gz")
+    with open(tally_path, mode='w') as f:
+        f.write("late tally")
+    assert calculate() == 4 * len(RESULTS_FORMATS) + 1
+    assert "results cache: 0 hits, 2 misses" in capfd.readouterr().out
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+
+import pytest
+
+from utils.tree import (edges2simpletree, get_list, list_all, get_ancestors,
+                        get_all_ancestors)
+from utils.hashed_changes import hash_question
+from config_updates import (derive_election_configs, get_changes_config,
+                            get_changes_tree, index_hashes,
+                            find_question_mappings, find_answer_mappings)
+
+# 1 -> 2 -> 4 -> 6, 1 -> 3 -> 4, 3 -> 5 and a separate 7 -> 8 chain. 4 has
+# two parents
+EDGES = [
+    [1, 2], [1, 3], [2, 4], [3, 4], [4, 6], [3, 5], [7, 8], [9, None]
+]
+
+APPLIED = []
+
+def add_tag(change, election_config):
+    '''
+    Change function used by the tests, see derive_election_configs()
+    '''
+    APPLIED.append(change['tag'])
+    election_config['tags'].append(change['tag'])
+
+def node_changes(election_ids):
+    return dict(
+        (election_id, [dict(action="add_tag", tag="tag-%d" % election_id)])
+        for election_id in election_ids)
+
+def test_all_ancestors_match_get_ancestors():
+    tree = edges2simpletree(EDGES)
+    all_ancestors = get_all_ancestors(tree)
+    election_ids = get_list(tree, list_all)
+    assert sorted(all_ancestors.keys()) == sorted(set(election_ids))
+    for election_id in election_ids:
+        assert all_ancestors[election_id] == get_ancestors(tree, election_id)
+
+def test_derive_election_configs():
+    tree = edges2simpletree(EDGES)
+    election_ids = sorted(set(get_list(tree, list_all)))
+    changes = node_changes(election_ids)
+    root_configs = []
+
+    def get_root_config(election_id):
+        root_configs.append(election_id)
+        return dict(id=election_id, tags=[])
+
+    del APPLIED[:]
+    configs = derive_election_configs(
+        tree, changes, election_ids, get_root_config, __name__)
+
+    for election_id in election_ids:
+        ancestors = get_ancestors(tree, election_id) + [election_id]
+        assert configs[election_id]['ancestors'] == ancestors
+        assert configs[election_id]['config'] == dict(
+            id=election_id,
+            tags=["tag-%d" % ancestor for ancestor in ancestors])
+
+    # each root config is read once, and each change applied once per path
+    assert sorted(root_configs) == [1, 7, 9]
+    assert len(APPLIED) == len(election_ids)
+
+def test_derived_configs_are_independent():
+    tree = edges2simpletree(EDGES)
+    election_ids = sorted(set(get_list(tree, list_all)))
+    configs = derive_election_configs(
+        tree, node_changes(election_ids), election_ids,
+        lambda election_id: dict(id=election_id, tags=[]), __name__)
+    expected = copy.deepcopy(configs[6]['config'])
+    configs[4]['config']['tags'].append("modified")
+    assert configs[6]['config'] == expected
+
+def test_changes_without_election_id_column(tmp_path):
+    changes_path = str(tmp_path / "changes.tsv")
+    with open(changes_path, mode='w', encoding="utf-8") as f:
+        f.write("@Changes\nnew_election_id\taction\n2\tadd_tag\n")
+    changes = get_changes_config(changes_path)
+    with pytest.raises(Exception) as error:
+        get_changes_tree(changes)
+    assert "election_id" in str(error.value)
+
+def linear_question_mappings(hashed_election_configs, ancestors, dest_question,
+    dest_question_num):
+    '''
+    find_question_mappings() before the hashes were indexed
+    '''
+    q_mappings = []
+    for ancestor in ancestors:
+        questions = hashed_election_configs[ancestor]['config']['questions']
+        for question_num, question in enumerate(questions):
+            if question['hash'] == dest_question['hash']:
+                q_mappings.append({
+                    'source_election_id': int(ancestor),
+                    'source_question_num': question_num,
+                    'source_question_title': question['title'],
+                    'dest_question_num': dest_question_num,
+                    'dest_question_title': dest_question['title'],
+                })
+    return q_mappings
+
+def linear_answer_mappings(hashed_election_configs, ancestors, dest_answer,
+    dest_question_num):
+    '''
+    find_answer_mappings() before the hashes were indexed
+    '''
+    answer_mappings = []
+    for ancestor in ancestors:
+        questions = hashed_election_configs[ancestor]['config']['questions']
+        for question_num, question in enumerate(questions):
+            for answer in question['answers']:
+                if answer['hash'] == dest_answer['hash']:
+                    answer_mappings.append({
+                        "source_election_id": int(ancestor),
+                        "source_question_num": question_num,
+                        "source_answer_id": answer['id'],
+                        "source_answer_text": answer['text'],
+                        "dest_question_num": dest_question_num,
+                        "dest_answer_id": dest_answer['id'],
+                        "dest_answer_text": dest_answer['text']
+                    })
+    return answer_mappings
+
+def hashed_question(election_id, question_num, texts):
+    question = dict(
+        title="Question %d" % question_num,
+        answers=[
+            dict(id=answer_id, text=text)
+            for answer_id, text in enumerate(texts)])
+    hash_question(question, election_id, question_num)
+    return question
+
+def test_indexed_mappings_match_the_linear_scan():
+    # 1 -> 2 -> 3, where 2 keeps the questions of 1 and repeats the first one,
+    # and 3 adds a new question and an answer with a repeated hash
+    questions_1 = [
+        hashed_question(1, 0, ["A", "B", "C"]),
+        hashed_question(1, 1, ["D", "E"]),
+    ]
+    questions_2 = copy.deepcopy(questions_1) + [copy.deepcopy(questions_1[0])]
+    questions_2[2]['title'] = "Repeated question"
+    questions_3 = copy.deepcopy(questions_2) + [hashed_question(3, 3, ["F"])]
+    questions_3[3]['answers'].append(
+        dict(copy.deepcopy(questions_1[1]['answers'][0]), id=1))
+    hashed_election_configs = dict()
+    for election_id, questions, ancestors in [
+            ("1", questions_1, ["1"]),
+            ("2", questions_2, ["1", "2"]),
+            ("3", questions_3, ["1", "2", "3"])]:
+        election_config = dict(questions=questions)
+        hashed_election_configs[election_id] = dict(
+            config=election_config,
+            ancestors=ancestors,
+            hashes=index_hashes(election_id, election_config))
+
+    num_mappings = 0
+    for election_id, hashed_election in hashed_election_configs.items():
+        ancestors = hashed_election['ancestors'][:-1]
+        questions = hashed_election['config']['questions']
+        for dest_question_num, question in enumerate(questions):
+            args = (hashed_election_configs, ancestors, question,
+                dest_question_num)
+            q_mappings = find_question_mappings(*args)
+            assert q_mappings == linear_question_mappings(*args)
+            num_mappings += len(q_mappings)
+            for answer in question['answers']:
+                args = (hashed_election_configs, ancestors, answer,
+                    dest_question_num)
+                answer_mappings = find_answer_mappings(*args)
+                assert answer_mappings == linear_answer_mappings(*args)
+                num_mappings += len(answer_mappings)
+    # the repeated hashes have several sources in the same election
+    assert num_mappings > 0
+    assert len(find_question_mappings(
+        hashed_election_configs, ["1", "2"], questions_3[0], 0)) == 3
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+
+import pytest
+
+from utils import csvblocks
+from utils.csvblocks import (iter_csv_blocks, build_block_index,
+                             get_block_index, read_block, Diagnostics,
+                             BLOCK_INDEX_EXTENSION)
+
+LINES = [
+    "#Election",
+    "Id,1",
+    "Title,Ñandú election",
+    "",
+    "#Question",
+    "Title,\"multi",
+    "line\"",
+    "Empty,",
+    "",
+    "@Options",
+    "Id,Text",
+    "0,Alice",
+    "1,",
+    "",
+    "@Options",
+    "Id,Text",
+    "0,Bob",
+]
+
+def write_blocks(path, newline):
+    with open(path, mode='wb') as f:
+        f.write(newline.join(LINES).encode("utf-8") + newline.encode("utf-8"))
+
+def parse_all(path):
+    return list(iter_csv_blocks(path, diagnostics=Diagnostics()))
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_read_block_matches_full_parse(tmp_path, newline):
+    path = str(tmp_path / "election.csv")
+    write_blocks(path, newline)
+    blocks = parse_all(path)
+    assert len(blocks) == 4
+
+    for number, block in enumerate(blocks):
+        assert read_block(path, number, diagnostics=Diagnostics()) == block
+    assert read_block(path, "Question", diagnostics=Diagnostics()) == blocks[1]
+    # the first block with the title is returned
+    assert read_block(path, "Options", diagnostics=Diagnostics()) == blocks[2]
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_index_offsets_and_line_numbers(tmp_path, newline):
+    path = str(tmp_path / "election.csv")
+    write_blocks(path, newline)
+    with open(path, mode='rb') as f:
+        data = f.read()
+
+    index = build_block_index(path)
+    assert [entry[1:] for entry in index['blocks']] == [
+        [1, "Form", "Election"],
+        [5, "Form", "Question"],
+        # line numbers count csv rows, like iter_csv_blocks()
+        [9, "Table", "Options"],
+        [14, "Table", "Options"],
+    ]
+    for offset, _, _, title in index['blocks']:
+        line = data[offset:].decode("utf-8")
+        assert line[1:].startswith(title)
+
+def test_read_block_reports_same_line_numbers(tmp_path):
+    path = str(tmp_path / "election.csv")
+    write_blocks(path, "\r")
+    full = Diagnostics()
+    list(iter_csv_blocks(path, diagnostics=full))
+    single = Diagnostics()
+    read_block(path, 2, diagnostics=single)
+    assert single.report()['groups'] == [
+        group for group in full.report()['groups']
+        if group['block_number'] == 2]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+def test_raw_lines_split_across_chunks(chunk_size):
+    iter_raw_lines = getattr(csvblocks, "__iter_raw_lines")
+    data = b"a\r\nb\rc\n\r\rd\r"
+    lines = list(iter_raw_lines(io.BytesIO(data), chunk_size=chunk_size))
+    assert lines == [b"a\r\n", b"b\r", b"c\n", b"\r", b"\r", b"d\r"]
+
+def test_index_is_rebuilt_when_the_file_changes(tmp_path):
+    path = str(tmp_path / "election.csv")
+    write_blocks(path, "\n")
+    index = get_block_index(path)
+    assert os.path.isfile(path + BLOCK_INDEX_EXTENSION)
+    assert len(index['blocks']) == 4
+
+    with open(path, mode='a', encoding="utf-8") as f:
+        f.write("\n#Extra\nKey,value\n")
+    index = get_block_index(path)
+    assert len(index['blocks']) == 5
+    assert read_block(path, "Extra", diagnostics=Diagnostics())['values'] == {
+        "Key": "value"}
+
+@pytest.mark.parametrize("name", ["election.csv.gz", "election.csv.xz", "-"])
+def test_compressed_and_stdin_input_cant_be_indexed(tmp_path, name):
+    path = name if name == "-" else str(tmp_path / name)
+    if name != "-":
+        write_blocks(path, "\n")
+    with pytest.raises(Exception, match="only uncompressed files can be indexed"):
+        read_block(path, 0, diagnostics=Diagnostics())
+    with pytest.raises(Exception, match="only uncompressed files can be indexed"):
+        build_block_index(path)
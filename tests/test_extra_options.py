@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from import_election_csv import compile_extra_options, parse_extra
+
+CONFIG = {
+    "extra_options": [
+        ["show_points", "bool", "question", False],
+        ["theme_variant", "str", "election", None],
+        ["tags", "list", "question", ["a"]],
+    ]
+}
+
+def test_defaults_apply_to_their_scope():
+    extra_options = compile_extra_options(CONFIG)
+    assert parse_extra({}, "question", extra_options) == dict(
+        show_points=False, tags=["a"])
+    # an explicit null default is still added
+    assert parse_extra({}, "election", extra_options) == dict(
+        theme_variant=None)
+
+def test_types_apply_to_both_scopes():
+    extra_options = compile_extra_options(CONFIG)
+    values = {"extra: answer_columns_size": "3", "extra: show_points": "TRUE"}
+    assert parse_extra(values, "election", extra_options) == dict(
+        answer_columns_size=3, show_points=True, theme_variant=None)
+
+def test_defaults_are_copied():
+    extra_options = compile_extra_options(CONFIG)
+    first = parse_extra({}, "question", extra_options)
+    first["tags"].append("b")
+    assert parse_extra({}, "question", extra_options)["tags"] == ["a"]
+
+def test_declaration_without_default_replaces_the_default():
+    config = dict(extra_options=CONFIG["extra_options"] + [
+        ["show_points", "bool", "question"]])
+    extra_options = compile_extra_options(config)
+    assert parse_extra({}, "question", extra_options) == dict(tags=["a"])
+
+@pytest.mark.parametrize("declaration", [
+    ["show_points", "bool"],
+    ["show_points", "float", "question"],
+    ["show_points", "bool", "answer"],
+])
+def test_invalid_declarations(declaration):
+    with pytest.raises(Exception):
+        compile_extra_options(dict(extra_options=[declaration]))
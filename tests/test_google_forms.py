@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import csv
+
+import pytest
+
+from import_election_csv import form_to_elections
+
+CONFIG = dict(
+    authorities=["a"],
+    director="d",
+    iam=dict(event_config=dict(auth_method="email"))
+)
+
+HEADER = [
+    "Título", "Descripción", "Comienzo", "Final", "Censo", "Título",
+    "Opciones", "¿Más preguntas?"
+]
+
+def form_row(title, start_date, census):
+    return [
+        title, "desc", start_date, "10/12/2020 10:00:00", "\n".join(census),
+        "Question", "Alice\nBob", "No"
+    ]
+
+def test_elections_are_yielded_as_their_rows_are_read(tmp_path):
+    path = str(tmp_path / "form.csv")
+    with open(path, mode='w', encoding="utf-8", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerow(form_row("First", "10/10/2020 10:00:00", ["a@x", "b@x"]))
+        # the seconds are required, so this row can't be read
+        writer.writerow(form_row("Second", "10/10/2020 10:00", ["c@x"]))
+
+    elections = form_to_elections(path, ",", CONFIG, 5)
+    election = next(elections)
+    assert election['id'] == 5
+    assert election['title'] == "First"
+    assert [answer['text'] for answer in election['questions'][0]['answers']] ==\
+        ["Alice", "Bob"]
+    assert list(election['census']) == [dict(email="a@x"), dict(email="b@x")]
+    with pytest.raises(ValueError):
+        next(elections)
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+from argparse import Namespace
+
+import pytest
+
+import import_election_csv
+from import_election_csv import (import_directory, import_executor,
+                                 load_config, watch_directory, IMPORT_MANIFEST)
+from utils.hashing import load_manifest
+
+CONFIG = dict(
+    authorities=["a"],
+    director="d",
+    tally_pipes_config=[["x", {}]]
+)
+
+ELECTION = """#Election
+Id,%(id)d
+Title,Election %(id)d
+Description,desc
+Start date time,10/10/2020 10:10:00
+%(extra)s
+#Question
+Title,Q0
+Maximum choices,%(max)d
+Minimum choices,0
+Number of winners,1
+Totals,over-total-votes
+
+@Options
+Id,Text
+0,Alice
+1,Bob
+"""
+
+def write_election(input_dir, election_id, max_choices=1, extra=""):
+    path = os.path.join(input_dir, "%d.csv" % election_id)
+    with open(path, mode='w', encoding="utf-8") as f:
+        f.write(ELECTION % dict(id=election_id, max=max_choices, extra=extra))
+    return path
+
+def make_args(input_dir, output_dir, **kwargs):
+    args = dict(
+        input_path=input_dir,
+        output_path=output_dir,
+        format="csv-blocks",
+        admin_format=False,
+        add_to_id=0,
+        warnings="json",
+        strict=False,
+        jobs=1,
+        bundle=None
+    )
+    args.update(kwargs)
+    return Namespace(**args)
+
+def run_import(args, capsys, config=CONFIG, **kwargs):
+    warnings_report = dict()
+    import_directory(args, config, "config-sha256", warnings_report, **kwargs)
+    return warnings_report, capsys.readouterr().out
+
+@pytest.fixture
+def dirs(tmp_path):
+    input_dir = str(tmp_path / "in")
+    output_dir = str(tmp_path / "out")
+    os.mkdir(input_dir)
+    return input_dir, output_dir
+
+def test_unchanged_files_are_skipped(dirs, capsys):
+    input_dir, output_dir = dirs
+    write_election(input_dir, 1)
+    write_election(input_dir, 2)
+    args = make_args(input_dir, output_dir)
+
+    run_import(args, capsys)
+    assert sorted(os.listdir(output_dir)) == [
+        IMPORT_MANIFEST, "1.config.json", "1.config.results.json",
+        "2.config.json", "2.config.results.json"]
+
+    write_election(input_dir, 2, extra="Layout,simple\n")
+    report, output = run_import(args, capsys)
+    assert "1 elections imported, 1 skipped as unchanged" in output
+    assert "importing 2.csv" in output
+    assert "importing 1.csv" not in output
+
+    report, output = run_import(args, capsys, force=True)
+    assert "2 elections imported, 0 skipped as unchanged" in output
+
+def test_only_changed_names_are_checked(dirs, capsys):
+    input_dir, output_dir = dirs
+    write_election(input_dir, 1)
+    write_election(input_dir, 2)
+    args = make_args(input_dir, output_dir)
+    run_import(args, capsys)
+
+    write_election(input_dir, 1, extra="Layout,simple\n")
+    write_election(input_dir, 2, extra="Layout,simple\n")
+    report, output = run_import(args, capsys, names=set(["2.csv"]))
+    assert "1 elections imported, 1 skipped as unchanged" in output
+    assert "importing 2.csv" in output
+
+    # a new file changes the position of the others, which only matters in
+    # admin format
+    write_election(input_dir, 0)
+    report, output = run_import(args, capsys, names=set(["0.csv"]))
+    assert "1 elections imported, 2 skipped as unchanged" in output
+    assert "importing 0.csv" in output
+
+def test_new_files_only_import_again_in_admin_format(dirs, capsys):
+    input_dir, output_dir = dirs
+    write_election(input_dir, 1)
+    write_election(input_dir, 2)
+    run_import(make_args(input_dir, output_dir), capsys)
+    write_election(input_dir, 0)
+    report, output = run_import(make_args(input_dir, output_dir), capsys)
+    assert "1 elections imported, 2 skipped as unchanged" in output
+
+    admin_config = dict(CONFIG, iam=dict(event_config={}, census_data=[]))
+    args = make_args(input_dir, output_dir + "-admin", admin_format=True)
+    os.unlink(os.path.join(input_dir, "0.csv"))
+    run_import(args, capsys, config=admin_config)
+    # the outputs are named after the position of the file
+    write_election(input_dir, 0)
+    report, output = run_import(args, capsys, config=admin_config)
+    assert "3 elections imported, 0 skipped as unchanged" in output
+
+def test_skipped_files_report_their_warnings(dirs, capsys):
+    input_dir, output_dir = dirs
+    # the maximum is lower than 1, which is a validation warning
+    write_election(input_dir, 1, max_choices=0)
+    write_election(input_dir, 2)
+    args = make_args(input_dir, output_dir)
+
+    report, output = run_import(args, capsys)
+    assert list(report.keys()) == ["1.csv"]
+    codes = [issue['code'] for issue in report["1.csv"]['validation']]
+    assert codes == ["invalid_max"]
+
+    skipped_report, output = run_import(args, capsys)
+    assert "0 elections imported, 2 skipped as unchanged" in output
+    assert skipped_report == report
+
+def test_warnings_mode_change_imports_again(dirs, capsys):
+    input_dir, output_dir = dirs
+    write_election(input_dir, 1, max_choices=0)
+
+    run_import(make_args(input_dir, output_dir, warnings="summary"), capsys)
+    report, output = run_import(make_args(input_dir, output_dir), capsys)
+    assert "1 elections imported, 0 skipped as unchanged" in output
+    assert list(report.keys()) == ["1.csv"]
+
+def test_outputs_of_removed_files_are_removed(dirs, capsys):
+    input_dir, output_dir = dirs
+    write_election(input_dir, 1)
+    removed_path = write_election(input_dir, 2)
+    args = make_args(input_dir, output_dir)
+    run_import(args, capsys)
+
+    os.unlink(removed_path)
+    report, output = run_import(args, capsys)
+    assert "removed stale 2.config.json" in output
+    assert "removed stale 2.config.results.json" in output
+    assert sorted(os.listdir(output_dir)) == [
+        IMPORT_MANIFEST, "1.config.json", "1.config.results.json"]
+    assert list(load_manifest(os.path.join(output_dir, IMPORT_MANIFEST)).keys()) == ["1.csv"]
+
+def test_outputs_of_changed_ids_are_removed(dirs, capsys):
+    input_dir, output_dir = dirs
+    path = write_election(input_dir, 1)
+    args = make_args(input_dir, output_dir)
+    run_import(args, capsys)
+
+    with open(path, mode='w', encoding="utf-8") as f:
+        f.write(ELECTION % dict(id=3, max=1, extra=""))
+    run_import(args, capsys)
+    assert sorted(os.listdir(output_dir)) == [
+        IMPORT_MANIFEST, "3.config.json", "3.config.results.json"]
+
+def test_failed_import_keeps_the_previous_entries(dirs, capsys):
+    input_dir, output_dir = dirs
+    write_election(input_dir, 1)
+    removed_path = write_election(input_dir, 2)
+    args = make_args(input_dir, output_dir)
+    run_import(args, capsys)
+
+    os.unlink(removed_path)
+    with open(os.path.join(input_dir, "1.csv"), mode='w', encoding="utf-8") as f:
+        f.write(ELECTION.replace("1,Bob", "1,Alice") % dict(id=1, max=1, extra=""))
+    with pytest.raises(Exception):
+        run_import(args, capsys)
+    # nothing was removed, and the removed file is still in the manifest so
+    # that its outputs are removed once the import succeeds
+    assert "2.csv" in load_manifest(os.path.join(output_dir, IMPORT_MANIFEST))
+    assert os.path.isfile(os.path.join(output_dir, "2.config.json"))
+
+    write_election(input_dir, 1)
+    report, output = run_import(args, capsys)
+    assert "removed stale 2.config.json" in output
+    assert not os.path.exists(os.path.join(output_dir, "2.config.json"))
+
+def test_parallel_imports_are_printed_in_order(dirs, capsys):
+    input_dir, output_dir = dirs
+    # more files than the imports submitted at once
+    for election_id in range(1, 8):
+        write_election(input_dir, election_id)
+    args = make_args(input_dir, output_dir, jobs=2)
+
+    with import_executor(args) as executor:
+        report, output = run_import(args, capsys, executor=executor)
+    assert "7 elections imported, 0 skipped as unchanged" in output
+    assert [
+        line for line in output.splitlines() if line.startswith("importing")
+    ] == ["importing %d.csv" % election_id for election_id in range(1, 8)]
+
+def test_watch_survives_a_missing_config(dirs, tmp_path, capsys, monkeypatch):
+    input_dir, output_dir = dirs
+    write_election(input_dir, 1)
+    config_path = str(tmp_path / "config.json")
+    with open(config_path, mode='w', encoding="utf-8") as f:
+        json.dump(CONFIG, f)
+    args = make_args(input_dir, output_dir, config_path=config_path,
+        watch_polling=True, watch_debounce=0)
+    config, config_sha256 = load_config(config_path)
+
+    def save_config():
+        # like an editor, the new config is renamed over the previous one
+        with open(config_path + ".new", mode='w', encoding="utf-8") as f:
+            json.dump(dict(CONFIG, director="e"), f)
+        os.replace(config_path + ".new", config_path)
+
+    steps = [lambda: os.unlink(config_path), save_config]
+    def wait_changes(watcher, timeout=None, debounce=0.2):
+        if len(steps) == 0:
+            raise KeyboardInterrupt()
+        steps.pop(0)()
+        return set()
+    monkeypatch.setattr(import_election_csv, "wait_changes", wait_changes)
+
+    watch_directory(args, config, config_sha256)
+    output = capsys.readouterr().out
+    assert "config %s changed, reloaded" % config_path in output
+    assert "1 elections imported, 0 skipped as unchanged" in output
+    assert "stopped watching" in output
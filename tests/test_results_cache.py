@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import pytest
+
+from utils.results_cache import (ResultsCache, remove_results, results_path,
+                                 tally_pipes_version)
+
+FORMATS = ["json", "pdf"]
+
+def write(path, data):
+    with open(path, mode='w', encoding="utf-8") as f:
+        f.write(data)
+
+def read(path):
+    with open(path, mode='r', encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture
+def paths(tmp_path):
+    elections_path = str(tmp_path / "elections")
+    os.makedirs(elections_path)
+    tally_path = str(tmp_path / "tally.tar.gz")
+    config_path = os.path.join(elections_path, "1.config.results.json")
+    write(tally_path, "tally")
+    write(config_path, "{}")
+    return dict(
+        cache_path=str(tmp_path / "cache"),
+        elections_path=elections_path,
+        tally_path=tally_path,
+        config_path=config_path)
+
+def cache_key(cache, paths):
+    return cache.key([paths['tally_path']], paths['config_path'], "true",
+        FORMATS)
+
+def write_results(paths, data):
+    for oformat in FORMATS:
+        write(results_path(paths['elections_path'], 1, oformat), data + oformat)
+
+def test_key_changes_with_the_inputs(paths):
+    cache = ResultsCache(paths['cache_path'])
+    key = cache_key(cache, paths)
+    assert cache_key(ResultsCache(paths['cache_path']), paths) == key
+
+    versioned = ResultsCache(paths['cache_path'], tally_pipes_version="1.2")
+    assert cache_key(versioned, paths) != key
+
+    write(paths['config_path'], '{"pipes": []}')
+    assert cache_key(cache, paths) != key
+
+def test_tally_pipes_version_from_config():
+    assert tally_pipes_version(dict(tally_pipes_version="7.0")) == "7.0"
+
+def test_restore_copies_by_default(paths):
+    cache = ResultsCache(paths['cache_path'])
+    key = cache_key(cache, paths)
+    assert not cache.restore(key, paths['elections_path'], 1, FORMATS)
+
+    write_results(paths, "results ")
+    assert cache.store(key, paths['elections_path'], 1, FORMATS)
+    remove_results(paths['elections_path'], 1, FORMATS)
+    assert cache.restore(key, paths['elections_path'], 1, FORMATS)
+    assert cache.stats == dict(hits=1, misses=1)
+
+    path = results_path(paths['elections_path'], 1, "json")
+    assert read(path) == "results json"
+    assert os.stat(path).st_nlink == 1
+    # writing the restored results in place doesn't modify the cache
+    write(path, "modified")
+    remove_results(paths['elections_path'], 1, FORMATS)
+    assert cache.restore(key, paths['elections_path'], 1, FORMATS)
+    assert read(path) == "results json"
+
+def test_restore_links_when_enabled(paths):
+    cache = ResultsCache(paths['cache_path'], link=True)
+    key = cache_key(cache, paths)
+    write_results(paths, "results ")
+    cache.store(key, paths['elections_path'], 1, FORMATS)
+    remove_results(paths['elections_path'], 1, FORMATS)
+    assert cache.restore(key, paths['elections_path'], 1, FORMATS)
+    path = results_path(paths['elections_path'], 1, "pdf")
+    assert os.stat(path).st_nlink == 2
+
+    # results are removed before writing them, so the cache is not modified
+    remove_results(paths['elections_path'], 1, ["pdf"])
+    write(path, "new pdf")
+    remove_results(paths['elections_path'], 1, FORMATS)
+    assert cache.restore(key, paths['elections_path'], 1, FORMATS)
+    assert read(path) == "results pdf"
+
+def test_incomplete_results_are_not_stored(paths):
+    cache = ResultsCache(paths['cache_path'])
+    key = cache_key(cache, paths)
+    write(results_path(paths['elections_path'], 1, "json"), "results json")
+    assert not cache.store(key, paths['elections_path'], 1, FORMATS)
+    assert not cache.restore(key, paths['elections_path'], 1, FORMATS)
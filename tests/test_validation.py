@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+
+import pytest
+
+from import_election_csv import (blocks_to_election, parse_date_time,
+                                 ElectionValidationError)
+
+CONFIG = dict(authorities=["a"], director="d")
+
+def make_blocks(minimum="0", maximum="1", winners="1", texts=("A", "B"),
+    ids=None, start_date=""):
+    if ids is None:
+        ids = range(len(texts))
+    election = {
+        "Id": "1",
+        "Title": "Election",
+        "Description": "",
+        "Start date time": start_date,
+    }
+    question = {
+        "Title": "Question",
+        "Minimum choices": minimum,
+        "Maximum choices": maximum,
+        "Number of winners": winners,
+        "Totals": "over-total-votes",
+    }
+    options = [
+        {"Id": str(answer_id), "Text": text}
+        for answer_id, text in zip(ids, texts)
+    ]
+    return [
+        dict(type="Form", name="Election", values=election),
+        dict(type="Form", name="Question", values=question),
+        dict(type="Table", name="Options", values=options),
+    ]
+
+def codes(issues):
+    return sorted(issue['code'] for issue in issues)
+
+INVALID_BOUNDS = [
+    (dict(minimum="-1"), "invalid_min", "minimum choices -1 is negative"),
+    (dict(minimum="2", maximum="1"), "min_greater_than_max",
+        "minimum choices 2 is greater than maximum choices 1"),
+    (dict(minimum="3", maximum="3"), "min_greater_than_answers",
+        "minimum choices 3 is greater than the number of options 2"),
+    (dict(maximum="0", minimum="0"), "invalid_max",
+        "maximum choices 0 is lower than 1"),
+    (dict(winners="0"), "invalid_num_winners",
+        "number of winners 0 is lower than 1"),
+    (dict(ids=[0, 0]), "duplicated_answer_id", "duplicated option id 0"),
+]
+
+@pytest.mark.parametrize("blocks_args,code,message", INVALID_BOUNDS)
+def test_invalid_bounds_are_warnings(blocks_args, code, message, capsys):
+    election = blocks_to_election(make_blocks(**blocks_args), CONFIG)
+    assert election['id'] == 1
+    assert len(election['questions']) == 1
+    # without an issues list the warnings are printed
+    printed = capsys.readouterr().out.splitlines()
+    assert "WARNING in question 0 'Question': " + message in printed
+
+    issues = []
+    blocks_to_election(make_blocks(**blocks_args), CONFIG, issues=issues)
+    assert code in codes(issues)
+
+@pytest.mark.parametrize("blocks_args,code,message", INVALID_BOUNDS)
+def test_invalid_bounds_are_errors_when_strict(blocks_args, code, message):
+    with pytest.raises(ElectionValidationError) as error:
+        blocks_to_election(make_blocks(**blocks_args), CONFIG, strict=True)
+    assert code in codes(error.value.issues)
+    assert all(
+        issue['level'] == "error"
+        for issue in error.value.issues
+        if issue['code'] == code)
+    assert "ERROR in question 0 'Question': " + message in str(error.value)
+
+def test_issues_are_collected(capsys):
+    issues = []
+    election = blocks_to_election(
+        make_blocks(minimum="-1", winners="0"), CONFIG, issues=issues)
+    assert election['id'] == 1
+    assert codes(issues) == ["invalid_min", "invalid_num_winners"]
+    assert all(issue['level'] == "warning" for issue in issues)
+    assert all(issue['question_num'] == 0 for issue in issues)
+    # collected issues are not printed
+    assert capsys.readouterr().out == ""
+
+def test_valid_election_has_no_issues():
+    issues = []
+    blocks_to_election(make_blocks(), CONFIG, issues=issues)
+    assert issues == []
+
+def test_duplicated_text_is_always_an_error():
+    issues = []
+    with pytest.raises(ElectionValidationError) as error:
+        blocks_to_election(
+            make_blocks(texts=("A", "A")), CONFIG, issues=issues)
+    assert codes(error.value.issues) == ["duplicated_answer_text"]
+    # the issues of the failed import are collected too
+    assert codes(issues) == ["duplicated_answer_text"]
+
+def test_invalid_start_date_is_an_error():
+    with pytest.raises(ElectionValidationError) as error:
+        blocks_to_election(make_blocks(start_date="tomorrow"), CONFIG)
+    assert codes(error.value.issues) == ["invalid_start_date"]
+
+def test_start_date_seconds_are_optional():
+    assert parse_date_time("10/11/2020 10:10") == datetime(2020, 11, 10, 10, 10)
+    assert parse_date_time("10/11/2020 10:10:05") == datetime(
+        2020, 11, 10, 10, 10, 5)
+
+@pytest.mark.parametrize("value", [
+    "10/11/2020 10:10\n",
+    "10/11/2020",
+    "31/02/2020 10:10",
+    "10/11/2020 10:10:05 ",
+])
+def test_invalid_date_times(value):
+    with pytest.raises(ValueError):
+        parse_date_time(value)
+
+def test_google_forms_dates_require_seconds():
+    assert parse_date_time(
+        "11/10/2020 10:10:05", month_first=True, require_seconds=True
+    ) == datetime(2020, 11, 10, 10, 10, 5)
+    with pytest.raises(ValueError):
+        parse_date_time("11/10/2020 10:10", month_first=True,
+            require_seconds=True)
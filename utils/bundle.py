@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import tarfile
+import tempfile
+
+from utils.json_serialize import (serialize, serialize_to_file,
+                                  serialize_list_to_file)
+from utils.deterministic_tar import (deterministic_tar_open,
+                                     deterministic_tar_add_fileobj)
+
+# Bundles store many json files in a single file, so that importing thousands
+# of elections doesn't create tens of thousands of tiny files. There are two
+# formats:
+#
+# - jsonl: JSON Lines, one line per file with the compact json object
+#   {"content": <file json>, "name": <file name>}.
+# - tar: a deterministic tar, optionally gzipped, with each file serialized
+#   exactly as it would be written to a directory.
+
+BUNDLE_FORMATS = ['jsonl', 'tar']
+
+# contents bigger than this are spooled to disk while a tar member is built
+BUNDLE_SPOOL_SIZE = 16*1024*1024
+
+def bundle_format(path):
+    '''
+    Returns the bundle format of a path from its extension, or None if it's
+    not a bundle
+    '''
+    if path.endswith(".jsonl"):
+        return 'jsonl'
+    if path.endswith(".tar") or path.endswith(".tar.gz") or path.endswith(".tgz"):
+        return 'tar'
+    return None
+
+class BundleWriter(object):
+    '''
+    Base class of the bundle writers, which can be used as context managers
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JsonLinesBundleWriter(BundleWriter):
+    '''
+    Writes files to a JSON Lines bundle
+    '''
+    def __init__(self, path):
+        self.f = open(path, mode='w', encoding="utf-8", errors='strict')
+
+    def add(self, name, data):
+        '''
+        Adds a file with the json of data
+        '''
+        self.f.write('{"content":')
+        serialize_to_file(data, self.f, compact=True)
+        self.f.write(',"name":%s}\n' % serialize(name, compact=True))
+
+    def add_list(self, name, items, serializer=serialize):
+        '''
+        Adds a file with a json list, serializing one item at a time so that
+        items can be a generator. See serialize_list_to_file().
+        '''
+        self.f.write('{"content":')
+        serialize_list_to_file(items, self.f, compact=True, serializer=serializer)
+        self.f.write(',"name":%s}\n' % serialize(name, compact=True))
+
+    def close(self):
+        self.f.close()
+
+class Utf8Writer(object):
+    '''
+    Writes text to a binary file, encoded in utf-8. The serializers only
+    call write(), and a TextIOWrapper can't wrap a SpooledTemporaryFile
+    before python 3.11.
+    '''
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, text):
+        self.f.write(text.encode("utf-8"))
+
+class TarBundleWriter(BundleWriter):
+    '''
+    Writes files to a deterministic tar bundle, gzipped if the path ends
+    with .gz or .tgz
+    '''
+    def __init__(self, path):
+        mode = "w:gz" if path.endswith(".gz") or path.endswith(".tgz") else "w"
+        self.tar = deterministic_tar_open(os.path.abspath(path), mode)
+
+    def __add_member(self, name, write):
+        with tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_SIZE) as spool:
+            write(Utf8Writer(spool))
+            size = spool.tell()
+            spool.seek(0)
+            deterministic_tar_add_fileobj(self.tar, spool, size, name)
+
+    def add(self, name, data):
+        '''
+        Adds a file with the json of data
+        '''
+        self.__add_member(name, lambda f: serialize_to_file(data, f))
+
+    def add_list(self, name, items, serializer=serialize):
+        '''
+        Adds a file with a json list, serializing one item at a time so that
+        items can be a generator. See serialize_list_to_file().
+        '''
+        self.__add_member(name,
+            lambda f: serialize_list_to_file(items, f, serializer=serializer))
+
+    def close(self):
+        self.tar.close()
+
+def open_bundle(path, format=None):
+    '''
+    Opens a bundle for writing. The format is taken from the extension of the
+    path if not given.
+    '''
+    if format is None:
+        format = bundle_format(path)
+    if format == 'jsonl':
+        return JsonLinesBundleWriter(path)
+    if format == 'tar':
+        return TarBundleWriter(path)
+    raise Exception("invalid bundle format %s for %s, valid formats: %s" % (
+        format, path, ", ".join(BUNDLE_FORMATS)))
+
+def iter_bundle(path, format=None):
+    '''
+    Iterates the files of a bundle, in the order they were added, as tuples
+    (name, data) with the data of the json file. Only one of them is loaded
+    at a time.
+    '''
+    if format is None:
+        format = bundle_format(path)
+    if format == 'jsonl':
+        with open(path, mode='r', encoding="utf-8", errors='strict') as f:
+            for line in f:
+                if len(line.strip()) == 0:
+                    continue
+                entry = json.loads(line)
+                yield entry['name'], entry['content']
+    elif format == 'tar':
+        with tarfile.open(path, "r:*") as tar:
+            for member in tar:
+                if not member.isreg():
+                    continue
+                with tar.extractfile(member) as f:
+                    yield member.name, json.loads(f.read().decode("utf-8"))
+    else:
+        raise Exception("invalid bundle format %s for %s, valid formats: %s" % (
+            format, path, ", ".join(BUNDLE_FORMATS)))
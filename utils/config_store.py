@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+import marshal
+import hashlib
+import collections
+
+class ElectionConfigStore(object):
+    '''
+    Loads the configuration of the elections downloaded to <id>.config.json
+    files, parsing each file at most once while it doesn't change.
+
+    Parsed configurations are kept in memory in a LRU of max_size files,
+    validated with the mtime and size of the file. If cache_path is set, they
+    are also saved there, so that later runs don't need to parse them either.
+
+    They are stored serialized with marshal, which is much faster to load
+    than json, and every get() returns a new copy, so callers can modify it.
+    '''
+    def __init__(self, cache_path=None, max_size=4096):
+        self.cache_path = cache_path
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.stats = dict(memory=0, disk=0, parsed=0)
+
+    def get(self, elections_path, election_id):
+        '''
+        Returns the configuration of an election
+        '''
+        path = os.path.join(elections_path, "%s.config.json" % election_id)
+        stat = os.stat(path)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            self.entries.move_to_end(path)
+            self.stats['memory'] += 1
+            return marshal.loads(entry[1])
+
+        data = self.__load_cached(path, stamp)
+        if data is not None:
+            self.stats['disk'] += 1
+        else:
+            with open(path, mode='r', encoding="utf-8", errors='strict') as f:
+                election_config = json.loads(f.read())["payload"]['configuration']
+            data = marshal.dumps(election_config)
+            self.stats['parsed'] += 1
+            self.__save_cached(path, stamp, data)
+
+        self.entries[path] = (stamp, data)
+        self.entries.move_to_end(path)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return marshal.loads(data)
+
+    def __cached_path(self, path):
+        name = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_path, name + ".marshal")
+
+    def __cache_version(self):
+        # marshal format depends on the python version
+        return [marshal.version, list(sys.version_info[:2])]
+
+    def __load_cached(self, path, stamp):
+        if self.cache_path is None:
+            return None
+        try:
+            with open(self.__cached_path(path), mode='rb') as f:
+                cached_stamp, version, data = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if cached_stamp != stamp or version != self.__cache_version():
+            return None
+        return data
+
+    def __save_cached(self, path, stamp, data):
+        if self.cache_path is None:
+            return
+        if not os.path.exists(self.cache_path):
+            os.makedirs(self.cache_path)
+        cached_path = self.__cached_path(path)
+        with open(cached_path + ".tmp", mode='wb') as f:
+            f.write(marshal.dumps([stamp, self.__cache_version(), data]))
+        os.replace(cached_path + ".tmp", cached_path)
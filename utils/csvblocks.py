@@ -16,17 +16,387 @@
 # along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import io
+import re
+import sys
+import bz2
+import gzip
+import lzma
+import json
 try:
-  from json_serialize import serialize
+  from json_serialize import serialize, serialize_list_to_file
+  from hashing import load_manifest, save_manifest, file_manifest_entry
 except:
-  from utils.json_serialize import serialize
+  from utils.json_serialize import serialize, serialize_list_to_file
+  from utils.hashing import load_manifest, save_manifest, file_manifest_entry
 import csv
 import argparse
+import traceback
+from itertools import repeat
+from contextlib import redirect_stdout
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping, Sequence
+
+class TableRow(Mapping):
+    '''
+    Read-only dict-like view of a Table block row, returned by
+    iter_csv_blocks() when compact_rows is set. All the rows of a table share
+    the same fields mapping (key -> position), and each row only stores a
+    tuple with its values, which takes a fraction of the memory of a dict.
+    '''
+    __slots__ = ('fields', 'row')
+
+    def __init__(self, fields, row):
+        self.fields = fields
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.row[self.fields[key]]
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+class FormValues(dict):
+    '''
+    The values of a Form block, returned by iter_csv_blocks(). It's a dict
+    with an index of its lower-cased keys, so that iget() finds a key
+    ignoring the case without scanning all of them. The index is built on
+    the first ignore-case lookup and dropped whenever the dict changes.
+    Exact lookups are plain dict lookups.
+    '''
+    __slots__ = ('lowered',)
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.lowered = None
+
+    def __setitem__(self, key, value):
+        self.lowered = None
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.lowered = None
+        dict.__delitem__(self, key)
+
+    def __ior__(self, other):
+        self.lowered = None
+        return dict.__ior__(self, other)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def pop(self, *args):
+        self.lowered = None
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.lowered = None
+        return dict.popitem(self)
+
+    def clear(self):
+        self.lowered = None
+        dict.clear(self)
+
+    def update(self, *args, **kwargs):
+        self.lowered = None
+        dict.update(self, *args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        self.lowered = None
+        return dict.setdefault(self, key, default)
+
+    def copy(self):
+        return self.__class__(self)
+
+    def real_key(self, key):
+        '''
+        Returns the key of the form that matches key ignoring the case, or
+        key itself if none does. If several keys match, the last one is used.
+        '''
+        if self.lowered is None:
+            self.lowered = dict(
+                (real_key.lower(), real_key) for real_key in self)
+        return self.lowered.get(key.lower(), key)
+
+    def iget(self, key, default=None):
+        '''
+        Ignore-case get
+        '''
+        return self.get(self.real_key(key), default)
+
+class TableColumns(Sequence):
+    '''
+    Columnar storage of the rows of a Table block, returned by
+    iter_csv_blocks() when columnar is set. Each column is stored in its own
+    list, so that scanning one column with column() doesn't need to touch the
+    rows. It can still be used as a list of rows: indexing or iterating it
+    returns ColumnRow views that can be read like a dict.
+
+    Missing values of rows that were shorter than the headers are stored as
+    None, and hidden by the row views.
+    '''
+    __slots__ = ('fields', 'columns', 'length', 'sparse')
+
+    def __init__(self):
+        self.fields = dict()
+        self.columns = []
+        self.length = 0
+        self.sparse = False
+
+    def set_schema(self, schema):
+        '''
+        Sets the columns of the table from a compile_table_schema() result
+        '''
+        self.fields = dict(
+            (key, position) for position, (_, key) in enumerate(schema))
+        self.columns = [[] for _ in schema]
+
+    def append_row(self, row):
+        '''
+        Appends a row given as a sequence with one value per column
+        '''
+        for column, value in zip(self.columns, row):
+            column.append(value)
+            if value is None:
+                self.sparse = True
+        self.length += 1
+
+    def column(self, key, default=None):
+        '''
+        Returns the list of values of a column. If the table doesn't have that
+        column, a list filled with the default value is returned instead.
+        '''
+        if key not in self.fields:
+            return [default] * self.length
+        return self.columns[self.fields[key]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ColumnRow(self, i) for i in range(self.length)[index]]
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError("table row index out of range")
+        return ColumnRow(self, index)
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield ColumnRow(self, index)
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+class ColumnRow(Mapping):
+    '''
+    Read-only dict-like view of one of the rows of a TableColumns
+    '''
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        value = self.table.columns[self.table.fields[key]][self.index]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        if not self.table.sparse:
+            return iter(self.table.fields)
+        return (key for key in self.table.fields if key in self)
+
+    def __len__(self):
+        if not self.table.sparse:
+            return len(self.table.fields)
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
 
-def csv_to_blocks(path, separator=",", strip_values=True):
+def table_column(rows, key, default=None):
+    '''
+    Returns the list of values of a column of the rows of a Table block,
+    whether the block was read in columnar mode or not
+    '''
+    if isinstance(rows, TableColumns):
+        return rows.column(key, default)
+    return [row.get(key, default) for row in rows]
+
+def compile_table_schema(headers):
+    '''
+    Resolves the header titles of a Table block once, returning the list of
+    (column index, stripped key) of the columns that have a non-empty title.
+    '''
+    schema = []
+    for index, key in enumerate(headers):
+        key = key.strip()
+        if len(key) > 0:
+            schema.append((index, key))
+    return schema
+
+COMPRESSED_OPENERS = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".bz2": bz2.open
+}
+
+def strip_compressed_extension(path):
+    '''
+    Removes the compression extension (.gz, .xz, .bz2) from a path, if any
+    '''
+    for extension in COMPRESSED_OPENERS.keys():
+        if path.endswith(extension):
+            return path[:-len(extension)]
+    return path
+
+@contextmanager
+def open_csv_file(path):
+    '''
+    Opens a csv file for reading as an utf-8 text stream. Files compressed with
+    gzip, xz or bzip2 are decompressed on the fly, based on their extension,
+    and "-" reads from the standard input.
+    '''
+    if path == "-":
+        f = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", errors='strict')
+        try:
+            yield f
+        finally:
+            # don't close stdin with the wrapper
+            f.detach()
+        return
+
+    opener = open
+    for extension, compressed_opener in COMPRESSED_OPENERS.items():
+        if path.endswith(extension):
+            opener = compressed_opener
+    with opener(path, mode='rt', encoding="utf-8", errors='strict') as f:
+        yield f
+
+WARNINGS_MODES = ['full', 'summary', 'json']
+
+class Diagnostics(object):
+    '''
+    Collects the warnings found while parsing csv-block files, like empty
+    Form or Table values, without printing them. Warnings are aggregated per
+    block and key, counting them and keeping the range of lines where they
+    were found, so that memory doesn't grow with the number of warnings.
+
+    Printed warnings are written to out, or to the standard output if None.
+    '''
+    def __init__(self, out=None):
+        self.out = out
+        self.total = 0
+        self.groups = dict()
+
+    def empty_value(self, block_type, block_number, block_title, key,
+        line_number, column, line_values):
+        '''
+        Registers an empty value in a block. column is the table index of the
+        value (starting with 1), or None in Forms.
+        '''
+        self.total += 1
+        group = self.groups.get((block_number, key))
+        if group is None:
+            group = self.groups[(block_number, key)] = dict(
+                kind="empty_%s_value" % block_type.lower(),
+                block_number=block_number,
+                block_title=block_title,
+                key=key.strip(),
+                column=column,
+                count=0,
+                first_line=line_number,
+                last_line=line_number
+            )
+        group['count'] += 1
+        group['last_line'] = line_number
+
+    def report(self):
+        '''
+        Returns the aggregated warnings as a json serializable dict
+        '''
+        return dict(
+            total=self.total,
+            groups=list(self.groups.values())
+        )
+
+    def print_summary(self):
+        '''
+        Prints one line per block and key with warnings
+        '''
+        for group in self.groups.values():
+            print("WARNING: %i empty %s values for key %s in block %i '%s', lines %i-%i" % (
+                group['count'],
+                group['kind'].split("_")[1],
+                group['key'],
+                group['block_number'],
+                group['block_title'],
+                group['first_line'],
+                group['last_line']), file=self.out)
+
+class PrintDiagnostics(Diagnostics):
+    '''
+    Diagnostics that also print every warning as soon as it's found
+    '''
+    def empty_value(self, block_type, block_number, block_title, key,
+        line_number, column, line_values):
+        super(PrintDiagnostics, self).empty_value(
+            block_type, block_number, block_title, key, line_number, column,
+            line_values)
+        if column is None:
+            print("WARNING: Empty form value for key %s at line %i" \
+                % (key, line_number), file=self.out)
+        else:
+            print("WARNING: Empty table value for key %s at line %i, table index %i" \
+                % (key, line_number, column), file=self.out)
+        print("         Line values: " + str(line_values), file=self.out)
+
+    def print_summary(self):
+        pass
+
+def get_diagnostics(mode="full", out=None):
+    '''
+    Returns the diagnostics collector for one of the WARNINGS_MODES: "full"
+    prints every warning, "summary" and "json" only collect them so that they
+    can be printed with print_summary() or saved with report().
+    '''
+    if mode == "full":
+        return PrintDiagnostics(out)
+    return Diagnostics(out)
+
+def csv_to_blocks(path, separator=",", strip_values=True, compact_rows=False,
+    columnar=False, diagnostics=None):
     '''
     Converts a CSV file into a list of dictionaries provided that the CSV
-    follows a specific format. The output is a list of blocks such that:
+    follows a specific format. See iter_csv_blocks() for a description of the
+    format. This function reads the whole file in memory, use iter_csv_blocks()
+    if you only need to process the blocks one by one.
+    '''
+    return list(iter_csv_blocks(
+        path, separator, strip_values, compact_rows, columnar, diagnostics))
+
+def iter_csv_blocks(path, separator=",", strip_values=True, compact_rows=False,
+    columnar=False, diagnostics=None):
+    '''
+    Generator that reads a CSV file and yields each block as soon as it has
+    been completely read, so that only one block is held in memory at a time.
+    The CSV must follow a specific format, such that:
 
     - Blocks are separated by lines that start with the separator character
     - There are different kinds of blocks:
@@ -81,82 +451,310 @@ def csv_to_blocks(path, separator=",", strip_values=True):
               },
             ]
           }
+
+          If compact_rows is True, the rows of the tables are returned as
+          TableRow objects instead of dicts. They can be read like a dict, but
+          all the rows of a table share the same key mapping.
+
+          If columnar is True, the values of the tables are instead returned as
+          TableColumns objects, which store one list per column. They can be
+          used as a list of rows, and TableColumns.column() gives direct
+          access to the list of values of a column.
+
+    Warnings like empty values are sent to diagnostics, a Diagnostics object.
+    By default they are printed as soon as they are found.
+
+    The file can be compressed, and path can be "-" to read from the standard
+    input, see open_csv_file().
+    '''
+    with open_csv_file(path) as f:
+        yield from iter_csv_file_blocks(
+            f, separator, strip_values, compact_rows, columnar, diagnostics)
+
+def iter_csv_file_blocks(f, separator=",", strip_values=True,
+    compact_rows=False, columnar=False, diagnostics=None, start_line=1,
+    start_block=0):
     '''
-    ret = []
+    Same as iter_csv_blocks(), but reads the blocks from an already open text
+    file. start_line and start_block are the line number and block number of
+    the first line read from the file, used in the warnings.
+    '''
+    if diagnostics is None:
+        diagnostics = PrintDiagnostics()
+    block_number = start_block - 1
     current_block = None
     new_block_flag = True
     headers = None
+    schema = None
+    fields = None
+
+    fcsv = csv.reader(f, delimiter=separator, quotechar='"')
+    for line_number, orig_values in enumerate(fcsv, start=start_line):
+        # get values
+        # to be safe, append some extra elements to the end of the list
+        values = orig_values + ["" for _ in range(10)]
+        if strip_values:
+            values = [val.strip() for val in values]
+
+
+        # check for new blocks
+        if new_block_flag:
+            title = values[0]
+            if title.startswith("#"):
+              new_block_flag = False
+              block_number += 1
+              current_block = dict(
+                type="Form",
+                title=title[1:],
+                values=FormValues()
+              )
+
+            elif title.startswith("@"):
+              headers = None
+              new_block_flag = False
+              block_number += 1
+              current_block = dict(
+                type="Table",
+                title=title[1:],
+                values=TableColumns() if columnar else []
+              )
+
+        # set new block flag if needed, and give away the finished block
+        elif len(list(filter(lambda x: len(x) != 0, values))) == 0:
+            new_block_flag = True
+            if current_block is not None:
+                yield current_block
+                current_block = None
+
+        # process blocks
+        elif current_block is not None:
+            if current_block["type"] == "Form":
+                key = values[0].strip()
+                if len(key) != 0:
+                    current_block['values'][key] = values[1]
+                    if 0 == len(str(values[1])):
+                        diagnostics.empty_value(
+                            "Form", block_number, current_block['title'], key,
+                            line_number, None, orig_values)
+            elif current_block['type'] == "Table":
+                if headers == None:
+                    # as we addeed some extra empty elements to the values,
+                    # we use here split again
+                    headers = orig_values
+                    schema = compile_table_schema(headers)
+                    if columnar:
+                        current_block['values'].set_schema(schema)
+                    fields = dict(
+                        (key, position)
+                        for position, (_, key) in enumerate(schema))
+                else:
+                    # rows way shorter than the headers only get the
+                    # columns they have
+                    columns = schema
+                    if len(values) < len(headers):
+                        columns = [
+                            column for column in schema
+                            if column[0] < len(values)]
+
+                    for index, key in columns:
+                        if 0 == len(str(values[index])):
+                            diagnostics.empty_value(
+                                "Table", block_number, current_block['title'],
+                                headers[index], line_number, index + 1,
+                                orig_values)
+
+                    if columnar:
+                        current_block['values'].append_row([
+                            values[index] if index < len(values) else None
+                            for index, _ in schema])
+                    elif not compact_rows:
+                        current_block['values'].append(
+                          dict((key, values[index]) for index, key in columns))
+                    elif columns is schema:
+                        current_block['values'].append(TableRow(
+                            fields,
+                            tuple(values[index] for index, _ in schema)))
+                    else:
+                        current_block['values'].append(TableRow(
+                            dict(
+                                (key, position)
+                                for position, (_, key) in enumerate(columns)),
+                            tuple(values[index] for index, _ in columns)))
+
+    if current_block is not None:
+        yield current_block
+
+BLOCK_INDEX_VERSION = 1
+BLOCK_INDEX_EXTENSION = ".blkidx"
 
-    with open(path, mode='r', encoding="utf-8", errors='strict') as f:
-        fcsv = csv.reader(f, delimiter=separator, quotechar='"')
-        for line_number, orig_values in enumerate(fcsv, start = 1):
-            # get values
-            # to be safe, append some extra elements to the end of the list
-            values = orig_values + ["" for _ in range(10)]
-            if strip_values:
-                values = [val.strip() for val in values]
+NEWLINE_RE = re.compile(b"\r\n|\r|\n")
 
+def __iter_raw_lines(f, chunk_size=1024*1024):
+    '''
+    Iterates the lines of a file opened in binary mode, including their line
+    endings. Like in a file opened in text mode with universal newlines, a
+    line can end with a line feed, a carriage return or both, so that the
+    byte offsets of the lines match the lines read by iter_csv_blocks().
+    '''
+    buffer = b""
+    while True:
+        chunk = f.read(chunk_size)
+        buffer += chunk
+        start = 0
+        for match in NEWLINE_RE.finditer(buffer):
+            # a carriage return at the end of the chunk might be the first
+            # half of a carriage return + line feed
+            if len(chunk) > 0 and match.end() == len(buffer) and\
+                match.group() == b"\r":
+                break
+            yield buffer[start:match.end()]
+            start = match.end()
+        buffer = buffer[start:]
+        if len(chunk) == 0:
+            break
+    if len(buffer) > 0:
+        yield buffer
+
+def __check_indexable(path):
+    '''
+    Raises an exception if path is the standard input or a compressed file,
+    which open_csv_file() reads as a stream.
+    '''
+    if path == "-" or strip_compressed_extension(path) != path:
+        raise Exception(
+            "Error: can't index %s, only uncompressed files can be indexed" % path)
+
+def build_block_index(path, separator=","):
+    '''
+    Reads a csv-blocks file and returns an index of its blocks, with the byte
+    offset, line number, type and title of each block:
+
+    {
+      "version": 1,
+      "separator": ",",
+      "size": 1234,
+      "mtime_ns": 1394060400000000000,
+      "blocks": [
+        [0, 1, "Form", "Some Title"],
+        [123, 8, "Table", "Table Title"],
+        ...
+      ]
+    }
+
+    The line numbers are counted like iter_csv_blocks() does, so that
+    read_block() reports the same line numbers in the warnings.
+
+    Compressed files and the standard input can't be indexed, because it's
+    not possible to seek into them.
+    '''
+    __check_indexable(path)
+    stat = os.stat(path)
+    blocks = []
+    offset = [0]
+
+    def read_lines(f):
+        # keep track of the byte offset of the next line to be read by the
+        # csv reader, translating line endings like a text mode open does
+        for line in __iter_raw_lines(f):
+            offset[0] += len(line)
+            line = line.decode("utf-8", errors='strict')
+            if line.endswith("\r\n"):
+                line = line[:-2] + "\n"
+            elif line.endswith("\r"):
+                line = line[:-1] + "\n"
+            yield line
+
+    with open(path, mode='rb') as f:
+        fcsv = csv.reader(read_lines(f), delimiter=separator, quotechar='"')
+        new_block_flag = True
+        line_number = 0
+        while True:
+            line_offset = offset[0]
+            try:
+                values = next(fcsv)
+            except StopIteration:
+                break
+            line_number += 1
+            values = [val.strip() for val in values]
 
-            # check for new blocks
             if new_block_flag:
-                title = values[0]
-                if title.startswith("#"):
-                  new_block_flag = False
-                  if current_block is not None:
-                      ret.append(current_block)
-
-                  current_block = dict(
-                    type="Form",
-                    title=title[1:],
-                    values=dict()
-                  )
-
-                elif title.startswith("@"):
-                  headers = None
-                  new_block_flag = False
-                  if current_block is not None:
-                      ret.append(current_block)
-
-                  current_block = dict(
-                    type="Table",
-                    title=title[1:],
-                    values=[]
-                  )
-
-            # set new block flag if needed
+                title = values[0] if len(values) > 0 else ""
+                if title.startswith("#") or title.startswith("@"):
+                    new_block_flag = False
+                    block_type = "Form" if title.startswith("#") else "Table"
+                    blocks.append([line_offset, line_number, block_type, title[1:]])
             elif len(list(filter(lambda x: len(x) != 0, values))) == 0:
                 new_block_flag = True
 
-            # process blocks
-            elif current_block is not None:
-                if current_block["type"] == "Form":
-                    key = values[0].strip()
-                    if len(key) != 0:
-                        current_block['values'][key] = values[1]
-                        if 0 == len(str(values[1])):
-                            print("WARNING: Empty form value for key %s at line %i" \
-                                % (key, line_number))
-                            print("         Line values: " + str(orig_values))
-                elif current_block['type'] == "Table":
-                    if headers == None:
-                        # as we addeed some extra empty elements to the values,
-                        # we use here split again
-                        headers = orig_values
-                    else:
-                        for vindex, zipped_value in enumerate(zip(headers, values), start=1):
-                            key = zipped_value[0]
-                            value = zipped_value[1]
-                            if len(key.strip()) > 0 and 0 == len(str(value)):
-                                print("WARNING: Empty table value for key %s at line %i, table index %i" \
-                                    % (key, line_number, vindex))
-                                print("         Line values: " + str(orig_values))
-                        current_block['values'].append(
-                          dict((key.strip(), value)
-                              for key, value in zip(headers, values) if len(key.strip()) > 0))
+    return dict(
+        version=BLOCK_INDEX_VERSION,
+        separator=separator,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        blocks=blocks
+    )
 
-        if current_block is not None:
-            ret.append(current_block)
-        return ret
+def get_block_index(path, separator=","):
+    '''
+    Returns the index of the blocks of a csv-blocks file, reading it from the
+    <path>.blkidx sidecar file when it's still valid for the current size and
+    modification time of the file. Otherwise the index is rebuilt and the
+    sidecar file is updated, if possible.
+    '''
+    __check_indexable(path)
+    index_path = path + BLOCK_INDEX_EXTENSION
+    stat = os.stat(path)
+    try:
+        with open(index_path, mode='r', encoding="utf-8", errors='strict') as f:
+            index = json.loads(f.read())
+        if index.get('version') == BLOCK_INDEX_VERSION and\
+            index.get('separator') == separator and\
+            index.get('size') == stat.st_size and\
+            index.get('mtime_ns') == stat.st_mtime_ns:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    index = build_block_index(path, separator)
+    try:
+        with open(index_path, mode='w', encoding="utf-8", errors='strict') as f:
+            f.write(json.dumps(index))
+    except OSError:
+        print("WARNING: can't write block index %s" % index_path)
+    return index
+
+def read_block(path, block, separator=",", compact_rows=False, columnar=False,
+    diagnostics=None):
+    '''
+    Reads a single block from a csv-blocks file without parsing the blocks
+    before it, using the block index (see get_block_index()) to seek directly
+    to it. block can be either the position of the block in the file
+    (starting with 0) or the title of the block, in which case the first
+    block with that title is returned. Only uncompressed files are supported.
+    '''
+    index = get_block_index(path, separator)
+    if isinstance(block, int):
+        if block < 0 or block >= len(index['blocks']):
+            raise Exception("Error: block %d not found in %s" % (block, path))
+        block_number = block
+    else:
+        block_numbers = [
+            block_number
+            for block_number, entry in enumerate(index['blocks'])
+            if entry[3] == block]
+        if len(block_numbers) == 0:
+            raise Exception("Error: block '%s' not found in %s" % (block, path))
+        block_number = block_numbers[0]
+
+    offset, line_number, _, _ = index['blocks'][block_number]
+    with open(path, mode='rb') as raw:
+        raw.seek(offset)
+        f = io.TextIOWrapper(raw, encoding="utf-8", errors='strict')
+        blocks = iter_csv_file_blocks(
+            f, separator, compact_rows=compact_rows, columnar=columnar,
+            diagnostics=diagnostics, start_line=line_number,
+            start_block=block_number)
+        return next(blocks)
 
 def __inc_eids(blocks, args):
     '''
@@ -170,17 +768,88 @@ def __custom(blocks, args):
     '''
     pass
 
+def json_export_path(path):
+    '''
+    Returns the path of the json file where a csv-block file is exported
+    '''
+    return strip_compressed_extension(path).replace(".csv", ".json")
+
 def blocks_to_json_file(path, blocks, args):
     '''
-    Save some blocks to a json file
+    Save some blocks to a json file. blocks can be a generator like the one
+    returned by iter_csv_blocks(), in which case each block is written as soon
+    as it has been read. The file is written to a temporary path first, so that
+    a parse error doesn't leave a truncated json file behind.
     '''
-    path = path.replace(".csv", ".json")
+    path = json_export_path(path)
 
     if args.verbose:
         print("saving %s" % path)
 
-    with open(path, mode='w', encoding="utf-8", errors='strict') as f:
-        f.write(serialize(blocks))
+    try:
+        with open(path + ".tmp", mode='w', encoding="utf-8", errors='strict') as f:
+            serialize_list_to_file(
+                blocks, f, compact=getattr(args, 'compact', False))
+        os.replace(path + ".tmp", path)
+    finally:
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+
+# increase it when the json-export output changes, so that all the files are
+# exported again instead of being skipped as unchanged
+JSON_EXPORT_VERSION = 2
+# maps each csv-block file name of a directory to its __manifest_entry(),
+# with the warnings report if it had warnings
+JSON_EXPORT_MANIFEST = ".csvblocks-manifest.json"
+
+def __manifest_entry(file_path, args, entry=None):
+    '''
+    Returns the json-export manifest entry for the current contents of a
+    file: its size, mtime and sha256 (see file_manifest_entry()), and the
+    separator and tool version used.
+    '''
+    entry = file_manifest_entry(file_path, entry)
+    entry.update(
+        separator=args.separator,
+        compact=args.compact,
+        version=JSON_EXPORT_VERSION
+    )
+    return entry
+
+def __process_file(file_path, args, capture=True):
+    '''
+    Processes a csv-block file with the action specified in args. Errors are
+    returned instead of raised, so that they don't abort the other files.
+    When executed in a worker process the output is captured and returned
+    instead of being printed, so that it can be printed in order, and with
+    capture unset it's printed right away.
+
+    Returns a tuple (output, error traceback or None, warnings report).
+    '''
+    output = io.StringIO()
+    diagnostics = get_diagnostics(args.warnings)
+    try:
+        with redirect_stdout(output) if capture else nullcontext():
+            if args.verbose:
+                print("processing %s" % os.path.basename(file_path))
+
+            blocks = iter_csv_blocks(
+                path=file_path,
+                separator=args.separator,
+                diagnostics=diagnostics)
+            if args.action == 'json-export':
+                blocks_to_json_file(path=file_path, blocks=blocks, args=args)
+            #elif args.action in ['inc-eids', 'custom']:
+                #{
+                  #"inc-eids": __inc_eids,
+                  #"custom": __custom
+                #}[args.action](blocks, args)
+                #blocks_to_csv_file(path=file_path, separator=args.separator, blocks=blocks)
+            if args.warnings == 'summary':
+                diagnostics.print_summary()
+    except Exception:
+        return output.getvalue(), traceback.format_exc(), diagnostics.report()
+    return output.getvalue(), None, diagnostics.report()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -193,18 +862,47 @@ if __name__ == '__main__':
           'json-export'],
         help='action to execute')
     parser.add_argument('directory',
-        type=str, help='directory containing the csv-block files')
+        type=str,
+        help='directory containing the csv-block files, which can be '
+             'compressed with gzip, xz or bzip2, or - to export the standard '
+             'input to the standard output')
 
     parser.add_argument('-v', '--verbose', help='be verbose',
         action='store_true')
     parser.add_argument('-s', '--separator',
         type=str, help='csv separator character', default=',')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='number of files to process in parallel (0 to use all the cpus)')
+    parser.add_argument('-f', '--force', action='store_true',
+        help='process all the files, even those that did not change since '
+             'the last json-export')
+    parser.add_argument('-c', '--compact', action='store_true',
+        help='write the json without indentation')
+    parser.add_argument('-w', '--warnings', choices=WARNINGS_MODES,
+        default='full',
+        help='print all the warnings, a summary per block and key, or save '
+             'them in json to --warnings-path')
+    parser.add_argument('--warnings-path', type=str, default='warnings.json',
+        help='path of the json warnings report, used with --warnings json')
     #parser.add_argument('--inc', type=int, default=1,
         #help=('Specifies how much should the id of the election be increased.' +
             #'Used together action "inc-eids"'))
 
     args = parser.parse_args()
 
+    # export stdin to stdout, printing the warnings to stderr
+    if args.directory == "-":
+        diagnostics = get_diagnostics(args.warnings, sys.stderr)
+        blocks = iter_csv_blocks(
+            path="-", separator=args.separator, diagnostics=diagnostics)
+        serialize_list_to_file(blocks, sys.stdout, compact=args.compact)
+        if args.warnings == 'summary':
+            diagnostics.print_summary()
+        elif args.warnings == 'json':
+            with open(args.warnings_path, mode='w', encoding="utf-8", errors='strict') as f:
+                f.write(serialize(diagnostics.report()))
+        exit(0)
+
     # directory should exist
     if not os.path.isdir(args.directory) or not os.access(args.directory, os.R_OK):
         print("directory doesn't exist or can't be read: %s" % args.directory)
@@ -215,22 +913,75 @@ if __name__ == '__main__':
         if os.path.isfile(os.path.join(args.directory, name)) and\
             os.access(args.directory, os.R_OK|os.W_OK)])
 
+    file_paths = [
+        os.path.join(args.directory, name)
+        for name in files
+        if strip_compressed_extension(name).endswith("csv")]
+
+    # skip the files that didn't change since they were last exported
+    manifest_path = os.path.join(args.directory, JSON_EXPORT_MANIFEST)
+    old_manifest = load_manifest(manifest_path)
+    manifest = dict()
+    skipped = []
+    pending = []
+    warnings_report = dict()
+    for file_path in file_paths:
+        name = os.path.basename(file_path)
+        old_entry = old_manifest.get(name)
+        entry = manifest[name] = __manifest_entry(file_path, args, old_entry)
+        if not args.force and\
+            old_entry is not None and\
+            all(
+                entry[key] == old_entry.get(key)
+                for key in ['sha256', 'separator', 'compact', 'version']) and\
+            os.path.isfile(json_export_path(file_path)):
+            if args.verbose:
+                print("skipping %s, unchanged" % name)
+            skipped.append(name)
+            # the warnings of the file are the same of the last export
+            if 'warnings' in old_entry:
+                entry['warnings'] = warnings_report[name] = old_entry['warnings']
+        else:
+            pending.append(file_path)
+    file_paths = pending
+
     # process each of the files with the specified action function and
-    # overwrite it
-    for name in files:
-        file_path = os.path.join(args.directory, name)
-        if not file_path.endswith("csv"):
-            continue
-
-        if args.verbose:
-            print("processing %s" % name)
-
-        blocks = csv_to_blocks(path=file_path, separator=args.separator)
-        if args.action == 'json-export':
-            blocks_to_json_file(path=file_path, blocks=blocks, args=args)
-        #elif args.action in ['inc-eids', 'custom']:
-            #{
-              #"inc-eids": __inc_eids,
-              #"custom": __custom
-            #}[args.action](blocks, args)
-            #blocks_to_csv_file(path=file_path, separator=args.separator, blocks=blocks)
+    # overwrite it. The output of each file is printed in order, even when
+    # they are processed in parallel
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    failed = []
+    # with a single job the files are processed in this process
+    executor = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(__process_file, file_paths, repeat(args))
+    else:
+        results = map(__process_file, file_paths, repeat(args), repeat(False))
+
+    try:
+        for file_path, (output, error, report) in zip(file_paths, results):
+            print(output, end="")
+            if report['total'] > 0:
+                warnings_report[os.path.basename(file_path)] = report
+                manifest[os.path.basename(file_path)]['warnings'] = report
+            if error is not None:
+                print("ERROR processing %s:" % os.path.basename(file_path))
+                print(error, end="")
+                failed.append(os.path.basename(file_path))
+                del manifest[os.path.basename(file_path)]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    save_manifest(manifest_path, manifest)
+    if args.warnings == 'json':
+        with open(args.warnings_path, mode='w', encoding="utf-8", errors='strict') as f:
+            f.write(serialize(warnings_report))
+    if args.verbose:
+        print("%d files processed, %d skipped as unchanged" % (
+            len(file_paths), len(skipped)))
+
+    if len(failed) > 0:
+        print("%d of %d files failed: %s" % (
+            len(failed), len(file_paths), ", ".join(failed)))
+        exit(1)
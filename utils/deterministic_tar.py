@@ -73,3 +73,19 @@ def deterministic_tar_add(tfile, filepath, arcname, timestamp=MAGIC_TIMESTAMP, u
             newarcname = os.path.join(arcname, subitem)
             deterministic_tar_add(tfile, newpath, newarcname, timestamp, uid,
                 gid)
+
+def deterministic_tar_add_fileobj(tfile, fileobj, size, arcname, timestamp=MAGIC_TIMESTAMP, uid=1000, gid=100):
+    '''
+    Adds a regular file with the contents of a file object, for contents that
+    are not in the filesystem, with the same fixed data as
+    deterministic_tarinfo()
+    '''
+    tarinfo = tarfile.TarInfo(arcname)
+    tarinfo.size = size
+    tarinfo.uid = uid
+    tarinfo.gid = gid
+    tarinfo.mode = 0o644
+    tarinfo.uname = ""
+    tarinfo.gname = ""
+    tarinfo.mtime = timestamp
+    tfile.addfile(tarinfo, fileobj)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import hashlib
+try:
+  from json_serialize import serialize_to_file
+except:
+  from utils.json_serialize import serialize_to_file
+
+def file_sha256(path):
+    '''
+    Returns the hexdigest of the sha256 of the contents of a file
+    '''
+    hasha = hashlib.sha256()
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(1024*1024), b''):
+            hasha.update(chunk)
+    return hasha.hexdigest()
+
+def load_manifest(path):
+    '''
+    Loads a manifest, which maps the names of the files processed to their
+    manifest entries. Returns an empty manifest if it doesn't exist or can't
+    be read.
+    '''
+    try:
+        with open(path, mode='r', encoding="utf-8", errors='strict') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return dict()
+
+def save_manifest(path, manifest):
+    '''
+    Atomically writes a manifest
+    '''
+    with open(path + ".tmp", mode='w', encoding="utf-8", errors='strict') as f:
+        serialize_to_file(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def file_manifest_entry(path, entry=None):
+    '''
+    Returns the size, mtime and sha256 of the current contents of a file, to
+    be extended with the options it's processed with. The previous manifest
+    entry of the file is used to avoid hashing it again if its size and mtime
+    didn't change.
+    '''
+    stat = os.stat(path)
+    if entry is not None and\
+        entry.get('size') == stat.st_size and\
+        entry.get('mtime_ns') == stat.st_mtime_ns:
+        sha256 = entry['sha256']
+    else:
+        sha256 = file_sha256(path)
+    return dict(
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        sha256=sha256
+    )
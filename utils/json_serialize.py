@@ -17,7 +17,125 @@
 
 import json
 from json import *
+from collections.abc import Mapping, Sequence
 
-def serialize(data):
-    return json.dumps(data,
-        indent=4, ensure_ascii=False, sort_keys=True, separators=(',', ': '))
+def serialize_default(obj):
+    '''
+    Serializes other read-only mappings and sequences, like csvblocks.TableRow
+    or csvblocks.TableColumns, as dicts and lists
+    '''
+    if isinstance(obj, Mapping):
+        return dict(obj.items())
+    if isinstance(obj, Sequence):
+        return list(obj)
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+def serialize_options(compact=False):
+    '''
+    Returns the json options used to serialize. The canonical format is
+    indented with 4 spaces, and the compact format has no whitespace at all.
+    Both sort the keys.
+    '''
+    if compact:
+        return dict(ensure_ascii=False, sort_keys=True, separators=(',', ':'),
+            default=serialize_default)
+    return dict(indent=4, ensure_ascii=False, sort_keys=True,
+        separators=(',', ': '), default=serialize_default)
+
+def serialize(data, compact=False):
+    return json.dumps(data, **serialize_options(compact))
+
+_scalar_encoder = json.JSONEncoder(ensure_ascii=False)
+_encode_string = json.encoder.encode_basestring
+
+def _encode_scalar(value):
+    if type(value) is str:
+        return _encode_string(value)
+    return _scalar_encoder.encode(value)
+
+def _encode_key(key):
+    if type(key) is not str:
+        raise TypeError(
+            "serialize_flat only serializes str keys, found %r of type %s" % (
+                key, type(key).__name__))
+    return _encode_string(key)
+
+def serialize_flat(data, compact=False):
+    '''
+    Returns the same as serialize() for a dict whose keys are strings and
+    whose values are all strings, numbers, booleans or None, like census
+    entries. It's much faster, because json only uses the pure python encoder
+    when indenting. Raises TypeError for other keys.
+    '''
+    if len(data) == 0:
+        return "{}"
+    if compact:
+        return "{" + ",".join([
+            _encode_key(key) + ":" + _encode_scalar(value)
+            for key, value in sorted(data.items())]) + "}"
+    return "{\n    " + ",\n    ".join([
+        _encode_key(key) + ": " + _encode_scalar(value)
+        for key, value in sorted(data.items())]) + "\n}"
+
+def serialize_to_file(data, f, compact=False):
+    '''
+    Writes the same output as serialize() to a file. The indented output is
+    written in batches of encoded chunks as they are generated, without
+    building the whole document in memory first. The compact output is built
+    with the C encoder instead, which json only uses without indentation and
+    is much faster than generating the chunks in python.
+    '''
+    if compact:
+        f.write(serialize(data, compact=True))
+        return
+    encoder = json.JSONEncoder(**serialize_options(compact))
+    chunks = []
+    for chunk in encoder.iterencode(data):
+        chunks.append(chunk)
+        if len(chunks) >= 4096:
+            f.write("".join(chunks))
+            chunks = []
+    f.write("".join(chunks))
+
+def serialize_list_to_file(items, f, compact=False, serializer=serialize):
+    '''
+    Writes an iterable to a file as a json list, serializing one item at a
+    time with serializer, so that only one of them needs to be in memory if
+    items is a generator. The output is the same as serialize(list(items)).
+    '''
+    if compact:
+        separator = ","
+        indent = ""
+    else:
+        separator = ",\n    "
+        indent = "\n    "
+
+    # serialized items are written in batches of around 64KiB
+    empty = True
+    chunks = []
+    size = 0
+    for item in items:
+        if empty:
+            chunks.append("[" + indent)
+            empty = False
+        else:
+            chunks.append(separator)
+        data = serializer(item, compact)
+        if not compact:
+            # newlines are always escaped inside json strings, so these are
+            # only the indentation ones
+            data = data.replace("\n", "\n    ")
+        chunks.append(data)
+        size += len(data)
+        if size >= 65536:
+            f.write("".join(chunks))
+            chunks = []
+            size = 0
+    f.write("".join(chunks))
+
+    if empty:
+        f.write("[]")
+    elif compact:
+        f.write("]")
+    else:
+        f.write("\n]")
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shlex
+import shutil
+import hashlib
+import tempfile
+import importlib.metadata
+
+from utils.hashing import file_sha256
+
+# increase when the way results are calculated or stored changes
+RESULTS_CACHE_VERSION = 2
+
+def tally_pipes_version(config):
+    '''
+    Returns the version of tally-pipes, which is the "tally_pipes_version" of
+    the config if set, or the version of the installed tally-pipes package,
+    or None if it's not installed
+    '''
+    version = config.get('tally_pipes_version')
+    if version is not None:
+        return str(version)
+    try:
+        return importlib.metadata.version("tally-pipes")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+def results_path(elections_path, election_id, oformat):
+    return os.path.join(elections_path, "%s.results.%s" % (election_id, oformat))
+
+class ResultsCache(object):
+    '''
+    Stores the results files of the elections in cache_path, keyed by the
+    sha256 of everything used to calculate them: the tallies of the chain in
+    order, the results config, the tally-pipes command and executable, and
+    the tally-pipes version, because the executable is usually just a
+    wrapper script.
+
+    Each entry is a directory named after its key, with one results.<format>
+    file per format. Entries are only added once complete, so a directory
+    always has all of the results of a calculation. They are copied to the
+    elections path, or hard linked if link is set, in which case the results
+    must be removed with remove_results() before writing them again.
+    '''
+    def __init__(self, cache_path, link=False, tally_pipes_version=None):
+        self.cache_path = cache_path
+        self.link = link
+        self.tally_pipes_version = tally_pipes_version
+        self.hashes = dict()
+        self.stats = dict(hits=0, misses=0)
+
+    def __file_sha256(self, path):
+        # the same tallies are used by all the elections of a chain, so their
+        # hashes are kept while they don't change
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        entry = self.hashes.get(path)
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, file_sha256(path))
+            self.hashes[path] = entry
+        return entry[1]
+
+    def __bin_identity(self, bin_path):
+        '''
+        Returns the command and the sha256 of its executable, if found
+        '''
+        identity = [bin_path]
+        args = shlex.split(bin_path)
+        executable = shutil.which(args[0]) if len(args) > 0 else None
+        if executable is not None:
+            identity.append(self.__file_sha256(os.path.realpath(executable)))
+        return identity
+
+    def key(self, tallies, config_path, bin_path, formats):
+        '''
+        Returns the cache key of the results of an election
+        '''
+        hasha = hashlib.sha256()
+        parts = (
+            ["v%d" % RESULTS_CACHE_VERSION] +
+            [self.__file_sha256(tally) for tally in tallies] +
+            ["config", self.__file_sha256(config_path)] +
+            ["bin"] + self.__bin_identity(bin_path) +
+            ["version", self.tally_pipes_version or ""] +
+            ["formats"] + list(formats))
+        for part in parts:
+            hasha.update(part.encode('utf-8'))
+            hasha.update(b"\0")
+        return hasha.hexdigest()
+
+    def __entry_path(self, key):
+        return os.path.join(self.cache_path, key[:2], key)
+
+    def restore(self, key, elections_path, election_id, formats):
+        '''
+        Copies or links the cached results of an election to elections_path.
+        Returns False if they are not in the cache.
+        '''
+        entry_path = self.__entry_path(key)
+        if not os.path.isdir(entry_path):
+            self.stats['misses'] += 1
+            return False
+
+        for oformat in formats:
+            source = os.path.join(entry_path, "results." + oformat)
+            dest = results_path(elections_path, election_id, oformat)
+            remove_results(elections_path, election_id, [oformat])
+            if self.link:
+                try:
+                    os.link(source, dest)
+                    continue
+                except OSError:
+                    # different filesystem, or links not supported
+                    pass
+            shutil.copy2(source, dest)
+        self.stats['hits'] += 1
+        return True
+
+    def store(self, key, elections_path, election_id, formats):
+        '''
+        Adds the results of an election to the cache. Missing results files
+        are not cached at all.
+        '''
+        paths = [
+            results_path(elections_path, election_id, oformat)
+            for oformat in formats]
+        if not all([os.path.isfile(path) for path in paths]):
+            return False
+
+        entry_path = self.__entry_path(key)
+        if os.path.isdir(entry_path):
+            return True
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        temp_path = tempfile.mkdtemp(dir=os.path.dirname(entry_path))
+        for oformat, path in zip(formats, paths):
+            shutil.copy2(path, os.path.join(temp_path, "results." + oformat))
+        try:
+            os.rename(temp_path, entry_path)
+        except OSError:
+            # stored at the same time by someone else
+            shutil.rmtree(temp_path)
+        return True
+
+def remove_results(elections_path, election_id, formats):
+    '''
+    Removes the results files of an election, so that new results are never
+    written through a link to a cached file.
+    '''
+    for oformat in formats:
+        path = results_path(elections_path, election_id, oformat)
+        if os.path.lexists(path):
+            os.unlink(path)
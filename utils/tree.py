@@ -106,3 +106,19 @@ def get_ancestors(tree, edge, ancestors=[]):
             if len(final_ancestors) > 0:
                 return final_ancestors
     return []
+
+def get_all_ancestors(tree, all_ancestors=None, ancestors=[]):
+    '''
+    Given a tree, returns a dict with the ancestors of each edge, the same
+    that get_ancestors would return for it, traversing the tree only once.
+    '''
+    if all_ancestors is None:
+        all_ancestors = dict()
+    for key, val in tree.items():
+        # an edge with more than one parent is found first in the same path
+        # that get_ancestors would return, and so is its subtree
+        if key in all_ancestors:
+            continue
+        all_ancestors[key] = ancestors
+        get_all_ancestors(val, all_ancestors, ancestors + [key])
+    return all_ancestors
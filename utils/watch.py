@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of misc-tools.
+# Copyright (C) 2014-2016  Sequent Tech Inc <legal@sequentech.io>
+
+# misc-tools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+
+# misc-tools  is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with misc-tools.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+
+# inotify events that change the files of a directory, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |\
+    IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+INOTIFY_EVENT = struct.Struct("iIII")
+
+class InotifyWatcher(object):
+    '''
+    Watches the files of a directory with inotify, which is only available
+    in linux. Raises OSError if it can't be used.
+    '''
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), path)
+
+    def wait(self, timeout=None):
+        '''
+        Waits up to timeout seconds, or forever if None, for changes in the
+        directory. Returns the set of names of the files that changed, which
+        is empty if there was no change.
+        '''
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return set()
+
+        names = set()
+        try:
+            data = os.read(self.fd, 64*1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if len(name) > 0:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher(object):
+    '''
+    Watches the files of a directory checking their size and mtime every
+    interval seconds. Works everywhere, but it has to stat all the files.
+    '''
+    def __init__(self, path, interval=0.5):
+        self.path = path
+        self.interval = interval
+        self.state = self.__scan()
+
+    def __scan(self):
+        state = dict()
+        for entry in os.scandir(self.path):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            state[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    def wait(self, timeout=None):
+        '''
+        Waits up to timeout seconds, or forever if None, for changes in the
+        directory. Returns the set of names of the files that changed, which
+        is empty if there was no change.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self.__scan()
+            names = set(
+                name
+                for name in set(state.keys()) | set(self.state.keys())
+                if state.get(name) != self.state.get(name))
+            self.state = state
+            if len(names) > 0:
+                return names
+
+            if deadline is None:
+                time.sleep(self.interval)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return names
+                time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+def get_watcher(path, polling=False):
+    '''
+    Returns an InotifyWatcher for the directory if inotify is available and
+    polling is not set, or a PollingWatcher otherwise
+    '''
+    if not polling:
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(path)
+
+def wait_changes(watcher, timeout=None, debounce=0.2):
+    '''
+    Waits up to timeout seconds for changes, and then keeps collecting them
+    until there are none for debounce seconds, so that a burst of writes to
+    the same files, like an editor saving them, is returned as a single set
+    of changed names.
+    '''
+    names = watcher.wait(timeout)
+    if len(names) == 0:
+        return names
+    while True:
+        more = watcher.wait(debounce)
+        if len(more) == 0:
+            return names
+        names |= more